@@ -0,0 +1,113 @@
+# batching.py
+"""Dynamic micro-batching: coalesce concurrent inference calls into one forward pass."""
+import asyncio, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """Collects submitted items and runs ``fn`` on lists of them.
+
+    A batch is flushed when it reaches ``max_batch_size`` items or when the
+    oldest item has waited ``max_wait_ms``. ``fn`` takes a list of items and
+    returns a list of results in the same order; it runs on a dedicated thread
+    so the event loop keeps serving other connections meanwhile. ``observe``,
+    if given, is called as observe("batch_wait", seconds) for every item.
+    """
+
+    def __init__(self, fn, max_batch_size=16, max_wait_ms=5.0, observe=None):
+        self.fn = fn
+        self.observe = observe
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = None
+        self._task = None
+        self._executor = None
+        self._batch_sizes = Counter()
+        self._items = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="infer")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, item):
+        """Queue one item and wait for its own row of the batched result."""
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, fut, time.perf_counter()))
+        return await fut
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued before sleeping on the deadline
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up while queued don't need a row
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                waited = started - queued_at
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                if self.observe is not None:
+                    self.observe("batch_wait", waited)
+            self._batch_sizes[len(batch)] += 1
+            self._items += len(batch)
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.fn, [item for item, _, _ in batch]
+                )
+            except Exception as exc:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            for (_, fut, _), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    def stats(self):
+        batches = sum(self._batch_sizes.values())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": batches,
+            "items": self._items,
+            "mean_batch_size": self._items / batches if batches else 0.0,
+            "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+            "mean_queue_wait_ms": 1000.0 * self._wait_total / self._items if self._items else 0.0,
+            "max_queue_wait_ms": 1000.0 * self._wait_max,
+        }
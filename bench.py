@@ -0,0 +1,263 @@
+# bench.py
+"""Offline throughput/latency benchmark with a stand-in encoder.
+
+Builds a small randomly initialised CLIP-shaped vision tower (seeded, in the
+regular bundle format) so nothing is downloaded. It then:
+
+* drives the app through ``/api/v1/predict`` at several concurrency levels,
+  in-process (ASGI) or through a local uvicorn, and reports p50/p95/p99
+  latency and requests/sec;
+* microbenchmarks decode, preprocess and forward on their own.
+
+Synthetic images come in several sizes and formats. Results are written
+as JSON so runs on two commits can be diffed:
+
+    python bench.py --out bench.json
+    python bench.py --server uvicorn --concurrency 1,8,32 --requests 400
+    python bench.py --bundle bundles/recycler --out real.json   # the real model
+"""
+import argparse, asyncio, io, json, os, platform, socket, statistics, subprocess, sys, tempfile, time
+import numpy as np
+from PIL import Image
+
+SIZES = ((320, 240), (640, 480), (1280, 960), (3024, 4032))
+FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+def synthetic_images(seed=0, sizes=SIZES, formats=FORMATS):
+    """(name, bytes) for every size x format: smooth gradients plus noise, like a photo."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for w, h in sizes:
+        yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+        base = np.stack([xx / w, yy / h, (xx + yy) / (w + h)], axis=-1) * 255
+        pixels = np.clip(base + rng.normal(0, 12, (h, w, 3)), 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels)
+        for fmt in formats:
+            buf = io.BytesIO()
+            image.save(buf, fmt, **({"quality": 90} if fmt != "PNG" else {}))
+            images.append((f"{w}x{h}.{fmt.lower()}", buf.getvalue()))
+    return images
+
+
+def standin_bundle(out_dir, seed=0, width=64, layers=2, heads=2, patch_size=32,
+                   input_resolution=224, output_dim=512, mlp_hidden=512):
+    """A seeded random CLIP-shaped vision tower + head, written as a regular bundle."""
+    import torch
+    from torch import nn
+    from clip.model import VisionTransformer
+    import bundle, catalog
+
+    torch.manual_seed(seed)
+    visual = VisionTransformer(input_resolution=input_resolution, patch_size=patch_size,
+                               width=width, layers=layers, heads=heads, output_dim=output_dim)
+    classes = list(catalog.CLASS_INFO)
+    head = nn.Sequential(
+        nn.Linear(output_dim, mlp_hidden), nn.ReLU(), nn.Dropout(0.2), nn.Linear(mlp_hidden, len(classes))
+    )
+    return bundle.write(out_dir, visual, head, f"standin-w{width}-l{layers}", classes)
+
+
+def percentiles(samples_s):
+    ordered = sorted(samples_s)
+
+    def pick(q):
+        return 1000.0 * ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": 1000.0 * statistics.fmean(ordered)}
+
+
+def _time(fn, repeat):
+    fn()  # warm
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return 1000.0 * statistics.median(samples)
+
+
+def microbench(bundle_dir, images, repeat=20, batch_sizes=(1, 16)):
+    """Median ms for decode / preprocess per image, and forward per batch size."""
+    import torch
+    import bundle, engines, imaging
+
+    tower, head, meta = bundle.load(bundle_dir)
+    n_px = tower.visual.input_resolution
+    preprocesses = {"clip": imaging.clip_preprocess(n_px), "fast": imaging.FastPreprocess(n_px)}
+    result = {"decode_ms": {}, "preprocess_ms": {}, "forward_ms": {}}
+    for name, data in images:
+        result["decode_ms"][name] = _time(lambda: imaging.decode_image(data), repeat)
+        for mode, preprocess in preprocesses.items():
+            draft = getattr(preprocess, "draft_size", None)
+            image = imaging.decode_image(data, draft)
+            result["preprocess_ms"][f"{name}/{mode}"] = _time(lambda: preprocess(image), repeat)
+    engine = engines.engine_from_config(tower, head, meta["tag"])
+    for size in batch_sizes:
+        x = torch.randn(size, 3, n_px, n_px)
+        result["forward_ms"][str(size)] = _time(lambda: engine(x), repeat)
+    return result
+
+
+async def _drive(client, images, concurrency, requests, endpoint):
+    """Fire ``requests`` uploads with at most ``concurrency`` in flight; (latencies, errors, wall s)."""
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            name, data = images[i % len(images)]
+            t0 = time.perf_counter()
+            r = await client.post(endpoint, files={"file": (name, data)})
+            if r.status_code == 200:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def load_test(client, images, levels, requests, endpoint, warmup=8):
+    await _drive(client, images, min(4, max(levels)), warmup, endpoint)
+    results = []
+    for concurrency in levels:
+        latencies, errors, wall = await _drive(client, images, concurrency, requests, endpoint)
+        row = {"concurrency": concurrency, "requests": requests, "errors": errors,
+               "rps": len(latencies) / wall if wall else 0.0}
+        row.update(percentiles(latencies) if latencies else {})
+        results.append(row)
+        print(f"  c={concurrency:<4} {row['rps']:8.1f} req/s  p50 {row.get('p50_ms', 0):7.1f}  "
+              f"p95 {row.get('p95_ms', 0):7.1f}  p99 {row.get('p99_ms', 0):7.1f} ms  errors {errors}")
+    return results
+
+
+async def _inprocess(images, levels, requests, endpoint):
+    import httpx
+    import main
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return await load_test(client, images, levels, requests, endpoint)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _uvicorn(images, levels, requests, endpoint, base_url=None):
+    import httpx
+
+    proc = None
+    if base_url is None:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                 "--log-level", "warning"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            deadline = time.monotonic() + 300
+            while True:
+                try:
+                    if (await client.get("/stats")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if proc is not None and proc.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{base_url} did not come up")
+                await asyncio.sleep(0.2)
+            return await load_test(client, images, levels, requests, endpoint)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+def _environment(settings):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import torch
+    import config
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cpus": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "settings": settings,
+        "engine": config.ENGINE,
+        "precision": config.PRECISION,
+        "compile": config.COMPILE,
+        "preprocess": config.PREPROCESS_MODE,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the prediction pipeline offline")
+    parser.add_argument("--server", default="inprocess",
+                        help="'inprocess' (ASGI, default), 'uvicorn' (spawn a local server) or a base URL")
+    parser.add_argument("--bundle", help="benchmark this bundle instead of the random stand-in encoder")
+    parser.add_argument("--endpoint", default="/api/v1/predict")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per microbenchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--out", help="write results as JSON here")
+    args = parser.parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    settings = {k: v for k, v in sorted(os.environ.items()) if k.startswith("RECYCLER_")}
+
+    with tempfile.TemporaryDirectory(prefix="recycler-bench-") as tmp:
+        bundle_dir = args.bundle or os.path.join(tmp, "standin")
+        # Settings are read once at import (config.py), by this process and any server it
+        # spawns, so they go in before anything imports config.
+        # Repeated uploads would otherwise be answered from the prediction cache.
+        os.environ["RECYCLER_BUNDLE"] = bundle_dir
+        os.environ.setdefault("RECYCLER_CACHE_ENTRIES", "0")
+        os.environ.setdefault("RECYCLER_ARTIFACT_DIR", os.path.join(tmp, "artifacts"))
+        if args.bundle is None:
+            standin_bundle(bundle_dir, seed=args.seed)
+
+        images = synthetic_images(args.seed)
+        report = {"environment": _environment(settings), "bundle": args.bundle or "standin",
+                  "seed": args.seed, "images": {name: len(data) for name, data in images}}
+        if not args.skip_micro:
+            print("microbenchmarks (median ms)")
+            report["micro"] = microbench(bundle_dir, images, args.repeat)
+            for stage, timings in report["micro"].items():
+                for name, ms in timings.items():
+                    print(f"  {stage:<14} {name:<24} {ms:8.2f}")
+        if not args.skip_load:
+            print(f"load test: {args.endpoint} via {args.server}")
+            if args.server == "inprocess":
+                runner = _inprocess(images, levels, args.requests, args.endpoint)
+            elif args.server == "uvicorn":
+                runner = _uvicorn(images, levels, args.requests, args.endpoint)
+            else:
+                runner = _uvicorn(images, levels, args.requests, args.endpoint, base_url=args.server)
+            report["load"] = asyncio.run(runner)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
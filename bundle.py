@@ -0,0 +1,268 @@
+# bundle.py
+"""Pre-converted model bundle for fast, offline cold starts.
+
+A bundle is a directory holding everything the server needs:
+
+    manifest.json  format version, CLIP vision-tower shape, head shape,
+                   classes, class_info and a sha256 per data file
+    weights.pt     flat state dict ("visual.*" and "head.*"), fp32
+    subtypes.npy   CLIP text embeddings of the subtypes (see subtypes.py),
+                   since the text tower is left out
+
+Weights are loaded with ``torch.load(mmap=True)`` and assigned straight into
+modules built on the meta device, so tensors are backed by the page cache
+instead of being copied, and several processes share one physical copy.
+
+    python bundle.py build bundles/recycler --checkpoint recycler_mlp.pth
+    python bundle.py verify bundles/recycler
+"""
+import argparse, hashlib, json, os, sys, time
+import numpy as np
+import torch
+from torch import nn
+import catalog, config, engines, subtypes
+
+FORMAT = "recycler-bundle"
+FORMAT_VERSION = 1
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ImageTower(nn.Module):
+    """The image half of a CLIP model: enough for engines.make_engine and encode_image."""
+
+    def __init__(self, visual):
+        super().__init__()
+        self.visual = visual
+
+    @property
+    def dtype(self):
+        return self.visual.conv1.weight.dtype
+
+    def encode_image(self, image):
+        return self.visual(image.type(self.dtype))
+
+
+def build(out_dir, checkpoint_path, class_info=None):
+    """Convert a recycler_mlp.pth checkpoint (+ its CLIP model) into a bundle.
+
+    ``class_info`` defaults to the checkpoint's own, as the server would use it.
+    """
+    import clip
+
+    ckpt = engines.load_checkpoint(checkpoint_path)
+    class_info = class_info or ckpt.get("class_info") or catalog.CLASS_INFO
+    clip_model, _ = clip.load(ckpt["clip_name"], device="cpu", jit=False)
+    # The bundle drops the text tower, so the subtype embeddings are encoded now and shipped with it
+    return write(
+        out_dir, clip_model.visual, engines.build_head(ckpt), ckpt["clip_name"], ckpt["classes"],
+        class_info, source_sha256=_sha256(checkpoint_path),
+        subtype_matrix=subtypes.encode(clip_model.encode_text, class_info),
+    )
+
+
+def replace_head(bundle_dir, checkpoint_path):
+    """Swap a retrained checkpoint's head and class_info into a bundle, keeping its vision weights.
+
+    The subtype embeddings stay while the class table is unchanged; a new one
+    can't be encoded without the text tower, so they are dropped.
+    """
+    ckpt = engines.load_checkpoint(checkpoint_path)
+    manifest = read_manifest(bundle_dir)
+    if (ckpt["clip_name"], ckpt["in_dim"]) != (manifest["clip_name"], manifest["in_dim"]):
+        raise ValueError(
+            f"{checkpoint_path} is a {ckpt['clip_name']} head, {bundle_dir} holds {manifest['clip_name']}"
+        )
+    tower, _, _ = load(bundle_dir)
+    class_info = ckpt.get("class_info") or catalog.CLASS_INFO
+    index = load_subtypes(bundle_dir, class_info)
+    manifest = write(
+        bundle_dir, tower.visual, engines.build_head(ckpt), ckpt["clip_name"], ckpt["classes"],
+        class_info, source_sha256=_sha256(checkpoint_path),
+        subtype_matrix=None if index is None else index.matrix.numpy(),
+    )
+    # Only once the new manifest no longer lists it
+    if index is None and os.path.exists(os.path.join(bundle_dir, "subtypes.npy")):
+        os.remove(os.path.join(bundle_dir, "subtypes.npy"))
+    return manifest
+
+
+def write(out_dir, visual, head, clip_name, classes, class_info=catalog.CLASS_INFO, source_sha256=None,
+          subtype_matrix=None):
+    """Write a CLIP VisionTransformer and an MLP head (as built by engines.build_head) as a bundle.
+
+    ``subtype_matrix`` is subtypes.encode's output for ``class_info``; without
+    it servers of this bundle fall back to random subtypes.
+    """
+    visual = visual.float().eval()
+    os.makedirs(out_dir, exist_ok=True)
+    state = {f"visual.{k}": v.contiguous() for k, v in visual.state_dict().items()}
+    state.update({f"head.{k}": v.contiguous() for k, v in head.state_dict().items()})
+    weights = os.path.join(out_dir, "weights.pt")
+    torch.save(state, weights + ".tmp")
+    os.replace(weights + ".tmp", weights)
+    files = {"weights.pt": {"sha256": _sha256(weights), "bytes": os.path.getsize(weights)}}
+    if subtype_matrix is not None:
+        path = os.path.join(out_dir, "subtypes.npy")
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(subtype_matrix, dtype=np.float32))
+        os.replace(path + ".tmp", path)
+        files["subtypes.npy"] = {"sha256": _sha256(path), "bytes": os.path.getsize(path)}
+
+    manifest = {
+        "format": FORMAT,
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "source_checkpoint_sha256": source_sha256,
+        "clip_name": clip_name,
+        "vision": {
+            "input_resolution": visual.input_resolution,
+            "patch_size": visual.conv1.kernel_size[0],
+            "width": visual.conv1.out_channels,
+            "layers": len(visual.transformer.resblocks),
+            "heads": visual.transformer.resblocks[0].attn.num_heads,
+            "output_dim": visual.output_dim,
+        },
+        "in_dim": head[0].in_features,
+        "mlp_hidden": head[0].out_features,
+        "classes": list(classes),
+        "class_info": class_info,
+        "subtypes_key": subtypes.cache_key(clip_name, class_info) if subtype_matrix is not None else None,
+        "files": files,
+    }
+    # The manifest goes last: a bundle without one is incomplete
+    with open(os.path.join(out_dir, "manifest.json.tmp"), "w") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(os.path.join(out_dir, "manifest.json.tmp"), os.path.join(out_dir, "manifest.json"))
+    return manifest
+
+
+def _tag(manifest):
+    return f"{manifest['clip_name'].replace('/', '-')}-bundle-{manifest['files']['weights.pt']['sha256'][:12]}"
+
+
+def read_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"{bundle_dir} is not a {FORMAT} v{FORMAT_VERSION} bundle "
+            f"(found {manifest.get('format')} v{manifest.get('format_version')})"
+        )
+    return manifest
+
+
+def verify(bundle_dir, manifest=None, full=True):
+    """Check every data file's size (and sha256 when ``full``); raises ValueError on mismatch."""
+    manifest = manifest or read_manifest(bundle_dir)
+    for name, expected in manifest["files"].items():
+        path = os.path.join(bundle_dir, name)
+        if os.path.getsize(path) != expected["bytes"]:
+            raise ValueError(f"{path}: size {os.path.getsize(path)} != {expected['bytes']}")
+        if full and _sha256(path) != expected["sha256"]:
+            raise ValueError(f"{path}: sha256 mismatch")
+    return manifest
+
+
+def load(bundle_dir, device="cpu", full_verify=False):
+    """Load a bundle as (image tower, head, metadata).
+
+    The metadata dict has the checkpoint keys the server uses (classes,
+    clip_name, in_dim, mlp_hidden) plus class_info and a version ``tag``.
+    """
+    from clip.model import VisionTransformer
+
+    manifest = verify(bundle_dir, full=full_verify)
+    state = torch.load(os.path.join(bundle_dir, "weights.pt"), map_location="cpu",
+                       mmap=True, weights_only=True)
+    v = manifest["vision"]
+    with torch.device("meta"):
+        visual = VisionTransformer(
+            input_resolution=v["input_resolution"], patch_size=v["patch_size"], width=v["width"],
+            layers=v["layers"], heads=v["heads"], output_dim=v["output_dim"],
+        )
+        head = nn.Sequential(
+            nn.Linear(manifest["in_dim"], manifest["mlp_hidden"]),
+            nn.ReLU(),
+            nn.Dropout(0.2),
+            nn.Linear(manifest["mlp_hidden"], len(manifest["classes"])),
+        )
+    # assign=True keeps the mmap-backed tensors instead of copying into fresh ones
+    visual.load_state_dict(
+        {k[len("visual."):]: t for k, t in state.items() if k.startswith("visual.")}, assign=True
+    )
+    head.load_state_dict(
+        {k[len("head."):]: t for k, t in state.items() if k.startswith("head.")}, assign=True
+    )
+    tower = ImageTower(visual).to(device).eval()
+    meta = {
+        "classes": manifest["classes"],
+        "clip_name": manifest["clip_name"],
+        "in_dim": manifest["in_dim"],
+        "mlp_hidden": manifest["mlp_hidden"],
+        "class_info": manifest["class_info"],
+        "tag": _tag(manifest),
+    }
+    return tower, head.to(device).eval(), meta
+
+
+def load_head(bundle_dir, device="cpu"):
+    """Only the head and metadata of a bundle (for hot reloads); the vision weights stay untouched."""
+    manifest = verify(bundle_dir, full=False)
+    state = torch.load(os.path.join(bundle_dir, "weights.pt"), map_location="cpu",
+                       mmap=True, weights_only=True)
+    ckpt = {
+        "in_dim": manifest["in_dim"],
+        "mlp_hidden": manifest["mlp_hidden"],
+        "classes": manifest["classes"],
+        "mlp_state": {k[len("head."):]: t.clone() for k, t in state.items() if k.startswith("head.")},
+    }
+    meta = {key: manifest[key] for key in ("classes", "clip_name", "in_dim", "mlp_hidden", "class_info")}
+    meta["tag"] = _tag(manifest)
+    return engines.build_head(ckpt, device), meta
+
+
+def load_subtypes(bundle_dir, class_info):
+    """The bundle's subtypes.SubtypeIndex when it was encoded for ``class_info``, else None."""
+    manifest = read_manifest(bundle_dir)
+    if manifest.get("subtypes_key") != subtypes.cache_key(manifest["clip_name"], class_info):
+        return None
+    path = os.path.join(bundle_dir, "subtypes.npy")
+    # Small enough to checksum on every load
+    if _sha256(path) != manifest["files"]["subtypes.npy"]["sha256"]:
+        raise ValueError(f"{path}: sha256 mismatch")
+    return subtypes.SubtypeIndex(class_info, np.load(path, allow_pickle=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or verify a model bundle")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="convert a checkpoint and its CLIP model into a bundle")
+    b.add_argument("out_dir")
+    b.add_argument("--checkpoint", default=config.CHECKPOINT_PATH)
+    v = sub.add_parser("verify", help="check a bundle's manifest and checksums")
+    v.add_argument("bundle_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        manifest = build(args.out_dir, args.checkpoint)
+        size = manifest["files"]["weights.pt"]["bytes"] / 2**20
+        print(f"wrote {args.out_dir} ({manifest['clip_name']}, {size:.0f} MiB)")
+    else:
+        try:
+            verify(args.bundle_dir, full=True)
+        except (ValueError, OSError) as exc:
+            print(f"invalid bundle: {exc}")
+            return 1
+        print(f"{args.bundle_dir}: ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
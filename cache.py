@@ -0,0 +1,124 @@
+# cache.py
+"""In-memory caches: predictions (content hash + optional dHash tier) and result thumbnails."""
+import hashlib, secrets, time
+from collections import OrderedDict
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """LRU + TTL cache of model outputs keyed by upload content.
+
+    When ``perceptual_distance`` is >= 0, entries are also indexed by the
+    image's dHash and a lookup hits if a cached frame is within that many
+    differing bits. The server clears it when a new model version is swapped
+    in, so results from an old head are never served.
+    """
+
+    def __init__(self, max_entries=4096, ttl_s=3600.0, perceptual_distance=-1):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl_s
+        self.perceptual_distance = perceptual_distance
+        self._entries = OrderedDict()  # key -> (value, expires_at, dhash)
+        self._by_dhash = {}            # dhash -> key
+        self.hits = self.perceptual_hits = self.misses = 0
+        self.evictions = self.invalidations = 0
+
+    @property
+    def perceptual(self):
+        return self.perceptual_distance >= 0
+
+    def clear(self):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._by_dhash.clear()
+
+    def _drop(self, key):
+        _, _, dh = self._entries.pop(key)
+        if dh is not None and self._by_dhash.get(dh) == key:
+            del self._by_dhash[dh]
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key):
+        """Exact lookup by content key; counts a miss only if there is no perceptual tier."""
+        value = self._live(key)
+        if value is not None:
+            self.hits += 1
+        elif not self.perceptual:
+            self.misses += 1
+        return value
+
+    def get_similar(self, dhash):
+        """Perceptual lookup: nearest cached frame within ``perceptual_distance`` bits."""
+        key = self._by_dhash.get(dhash)
+        if key is None and self.perceptual_distance > 0:
+            best = self.perceptual_distance + 1
+            for other, other_key in self._by_dhash.items():
+                distance = (other ^ dhash).bit_count()
+                if distance < best:
+                    best, key = distance, other_key
+        value = self._live(key) if key is not None else None
+        if value is not None:
+            self.perceptual_hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, key, value, dhash=None):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl, dhash)
+        if dhash is not None:
+            self._by_dhash[dhash] = key
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.perceptual_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "perceptual_hits": self.perceptual_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.perceptual_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class PreviewStore:
+    """Short-lived in-memory store of result thumbnails, served by token URL."""
+
+    def __init__(self, max_entries=512, ttl_s=300.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl_s
+        self._items = OrderedDict()  # token -> (jpeg bytes, expires_at)
+
+    def put(self, jpeg):
+        now = time.monotonic()
+        while self._items and (len(self._items) >= self.max_entries
+                               or next(iter(self._items.values()))[1] < now):
+            self._items.popitem(last=False)
+        token = secrets.token_urlsafe(16)
+        self._items[token] = (jpeg, now + self.ttl)
+        return token
+
+    def get(self, token):
+        item = self._items.get(token)
+        if item is None or item[1] < time.monotonic():
+            return None
+        return item[0]
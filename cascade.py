@@ -0,0 +1,195 @@
+# cascade.py
+"""Two-tier inference: a cheap first stage answers confident inputs, the rest escalate.
+
+The first stage is a model in one of the server's own formats, trained on the
+same classes: a recycler_mlp.pth-style checkpoint for a smaller CLIP backbone,
+or a bundle directory (e.g. a small or low-resolution image tower). It sees
+each batch resized to its own input resolution and answers an input when the
+margin between its top two softmax probabilities reaches the threshold. Only
+the uncertain inputs go through the full CLIP + head.
+
+    python cascade.py calibrate data/valid --first-stage small.pth --max-drop 0.005
+    python cascade.py calibrate data/valid --first-stage bundles/small --target 0.95
+
+``calibrate`` runs both stages over a labeled ImageFolder and prints the
+lowest threshold (fewest escalations) whose cascade accuracy meets the target.
+"""
+import argparse, functools, json, os, sys, time
+import numpy as np
+import torch
+import torch.nn.functional as F
+import config, engines, imaging
+from workers import make_executor, prefetch
+
+
+def margin(logits):
+    """Top-1 minus top-2 softmax probability per row."""
+    probs = logits.float().softmax(dim=-1)
+    if probs.shape[-1] < 2:
+        return torch.ones(probs.shape[0])
+    top = probs.topk(2, dim=-1).values
+    return top[:, 0] - top[:, 1]
+
+
+def load_stage(path, device="cpu"):
+    """(clip_model, head, preprocess, meta) for a first stage given as a checkpoint file or bundle dir."""
+    if os.path.isdir(path):
+        return engines.load_model(device, bundle_path=path)
+    return engines.load_model(device, checkpoint_path=path, bundle_path="")
+
+
+class Cascade:
+    """The first-stage engine, its threshold and how often it had to escalate."""
+
+    def __init__(self, engine, classes, threshold):
+        self.engine = engine
+        self.classes = list(classes)
+        self.threshold = threshold
+        self.answered = self.escalated = 0
+
+    def first_pass(self, x):
+        """(first-stage logits, bool mask of the inputs it answers) for a preprocessed batch."""
+        if x.shape[-1] != self.engine.n_px:
+            x = F.interpolate(x.float(), size=(self.engine.n_px, self.engine.n_px),
+                              mode="bilinear", antialias=True, align_corners=False)
+        _, logits = self.engine(x)
+        easy = margin(logits) >= self.threshold
+        answered = int(easy.sum())
+        self.answered += answered
+        self.escalated += len(easy) - answered
+        return logits, easy
+
+    def stats(self):
+        total = self.answered + self.escalated
+        return {
+            "threshold": self.threshold,
+            "answered": self.answered,
+            "escalated": self.escalated,
+            "escalation_rate": self.escalated / total if total else None,
+        }
+
+
+def load(path, device, make_engine, threshold, classes, warmup_sizes=()):
+    """A warmed-up Cascade for the model at ``path``; its classes must match the full model's."""
+    clip_model, head, _, meta = load_stage(path, device)
+    if list(meta["classes"]) != list(classes):
+        raise ValueError(f"first stage {path} predicts {meta['classes']}, the full model {classes}")
+    engine = make_engine(clip_model, head, meta["tag"])
+    engines.warmup(engine, warmup_sizes)
+    return Cascade(engine, classes, threshold)
+
+
+def choose_threshold(margins, first_ok, full_ok, target):
+    """(threshold, cascade accuracy, escalation rate) with the fewest escalations reaching ``target``.
+
+    Answering the i highest-margin inputs with the first stage is possible
+    for every i where the margin strictly drops; the accuracy of each split
+    comes from two cumulative sums. Without any split reaching the target,
+    everything escalates (threshold inf).
+    """
+    order = np.argsort(-margins, kind="stable")
+    m, f, g = margins[order], first_ok[order].astype(np.int64), full_ok[order].astype(np.int64)
+    n = len(m)
+    correct = np.concatenate([[0], np.cumsum(f)]) + g.sum() - np.concatenate([[0], np.cumsum(g)])
+    valid = np.ones(n + 1, dtype=bool)
+    valid[1:n] = m[:-1] > m[1:]
+    ok = np.flatnonzero(valid & (correct >= target * n))
+    i = int(ok[-1]) if len(ok) else 0
+    threshold = float(m[i - 1]) if i else float("inf")
+    return threshold, correct[i] / n, (n - i) / n
+
+
+def calibrate(folder, first_stage, target=None, max_drop=0.01, batch_size=64, workers=None, log=print):
+    """Score ``folder`` with both stages and pick the threshold; returns a report dict."""
+    device = engines.default_device()
+    clip_model, head, preprocess, meta, full = engines.from_config(device)
+    classes = meta["classes"]
+    first = load(first_stage, device, functools.partial(engines.engine_from_config, device=device), 0.0, classes)
+
+    samples = [(p, classes.index(label)) for p, label in imaging.image_folder(folder) if label in classes]
+    if not samples:
+        raise ValueError(f"no images under {folder} labeled with one of {classes}")
+    labels = dict(samples)
+    margins, first_ok, full_ok = [], [], []
+    seconds = {"first": 0.0, "full": 0.0}
+    executor = make_executor("process", workers or config.CPU_SHARE, preprocess)
+    try:
+        for chunk, futures in prefetch(executor, imaging.load_file, [p for p, _ in samples], batch_size):
+            tensors, y = [], []
+            for path, future in zip(chunk, futures):
+                try:
+                    tensors.append(future.result())
+                except Exception as exc:
+                    log(f"  skipping {path}: {type(exc).__name__}: {exc}")
+                    continue
+                y.append(labels[path])
+            if not tensors:
+                continue
+            x, y = torch.stack(tensors), torch.tensor(y)
+            if x.dtype == torch.uint8:
+                x = imaging.normalize(x)
+            t0 = time.perf_counter()
+            logits1, _ = first.first_pass(x)
+            t1 = time.perf_counter()
+            _, logits2 = full(x)
+            seconds["first"] += t1 - t0
+            seconds["full"] += time.perf_counter() - t1
+            margins.append(margin(logits1))
+            first_ok.append(logits1.argmax(1) == y)
+            full_ok.append(logits2.argmax(1) == y)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    margins = torch.cat(margins).numpy()
+    first_ok, full_ok = torch.cat(first_ok).numpy(), torch.cat(full_ok).numpy()
+    n = len(margins)
+    full_acc = float(full_ok.mean())
+    target = target if target is not None else full_acc - max_drop
+    threshold, acc, escalation = choose_threshold(margins, first_ok, full_ok, target)
+    cost = (seconds["first"] + escalation * seconds["full"]) / seconds["full"]
+    report = {
+        "images": n,
+        "first_stage_accuracy": float(first_ok.mean()),
+        "full_accuracy": full_acc,
+        "target_accuracy": target,
+        "threshold": threshold,
+        "cascade_accuracy": float(acc),
+        "escalation_rate": float(escalation),
+        "ms_per_image": {k: 1000 * v / n for k, v in seconds.items()},
+        "relative_cost": cost,
+    }
+    log(f"{n} images: first stage {report['first_stage_accuracy']:.4f}, full model {full_acc:.4f}")
+    for q in (0.9, 0.75, 0.5, 0.25, 0.1):
+        t = float(np.quantile(margins, 1 - q))
+        answered = margins >= t
+        a = (first_ok[answered].sum() + full_ok[~answered].sum()) / n
+        log(f"  threshold {t:.4f}: first stage answers {answered.mean():.0%}, accuracy {a:.4f}")
+    log(f"target {target:.4f}: threshold {threshold:.4f}, accuracy {acc:.4f}, escalation {escalation:.1%}, "
+        f"{cost:.2f}x the full model's compute")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confidence-gated cascade tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    c = sub.add_parser("calibrate", help="pick the first-stage threshold on a labeled ImageFolder")
+    c.add_argument("folder", help="ImageFolder layout: one sub-folder per class")
+    c.add_argument("--first-stage", required=True, help="checkpoint file or bundle directory")
+    c.add_argument("--target", type=float, help="cascade accuracy to reach (absolute)")
+    c.add_argument("--max-drop", type=float, default=0.01,
+                   help="without --target: accuracy the cascade may lose against the full model")
+    c.add_argument("--batch-size", type=int, default=64)
+    c.add_argument("--workers", type=int, default=config.CPU_SHARE, help="decode processes")
+    c.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = calibrate(args.folder, args.first_stage, args.target, args.max_drop, args.batch_size, args.workers)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(f"RECYCLER_CASCADE_MODEL={args.first_stage} RECYCLER_CASCADE_THRESHOLD={report['threshold']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
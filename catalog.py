@@ -0,0 +1,126 @@
+# catalog.py
+"""Class metadata: subtypes, display colors/icons and CO2 savings per material."""
+import json
+
+# Class mapping to subtypes, colors, and CO2 emissions
+CLASS_INFO = {
+    'plastic': {
+        'subtypes': ['PET Bottle', 'PVC Container', 'HDPE Container', 'PP Container'],
+        'color': '#0066CC',
+        'gradient': 'linear-gradient(135deg, #0066CC 0%, #0099FF 100%)',
+        'co2': 2.8,
+        'icon': '♻️',
+        'category': 'Plastic'
+    },
+    'glass': {
+        'subtypes': ['Clear Glass', 'Colored Glass', 'Wine Bottle', 'Container Glass'],
+        'color': '#00AACC',
+        'gradient': 'linear-gradient(135deg, #00AACC 0%, #00DDFF 100%)',
+        'co2': 0.3,
+        'icon': '🪟',
+        'category': 'Glass'
+    },
+    'paper': {
+        'subtypes': ['Cardboard', 'Newspaper', 'Office Paper', 'Magazine'],
+        'color': '#FF9933',
+        'gradient': 'linear-gradient(135deg, #FF9933 0%, #FFCC66 100%)',
+        'co2': 1.5,
+        'icon': '📄',
+        'category': 'Paper'
+    },
+    'cardboard': {
+        'subtypes': ['Corrugated Cardboard', 'Box Cardboard', 'Packing Cardboard'],
+        'color': '#FF9933',
+        'gradient': 'linear-gradient(135deg, #FF9933 0%, #FFCC66 100%)',
+        'co2': 1.8,
+        'icon': '📦',
+        'category': 'Cardboard'
+    },
+    'metal': {
+        'subtypes': ['Aluminum Can', 'Steel Can', 'Tin Container', 'Copper Item'],
+        'color': '#888888',
+        'gradient': 'linear-gradient(135deg, #888888 0%, #CCCCCC 100%)',
+        'co2': 2.0,
+        'icon': '🗑️',
+        'category': 'Metal'
+    },
+    'can': {
+        'subtypes': ['Aluminum Can', 'Tin Can', 'Beverage Can'],
+        'color': '#888888',
+        'gradient': 'linear-gradient(135deg, #888888 0%, #CCCCCC 100%)',
+        'co2': 2.2,
+        'icon': '🥫',
+        'category': 'Metal Can'
+    },
+    'bottle': {
+        'subtypes': ['PET Bottle', 'Glass Bottle', 'HDPE Bottle', 'Aluminum Bottle'],
+        'color': '#0066CC',
+        'gradient': 'linear-gradient(135deg, #0066CC 0%, #0099FF 100%)',
+        'co2': 2.5,
+        'icon': '🍼',
+        'category': 'Bottle'
+    },
+    'battery': {
+        'subtypes': ['Alkaline Battery', 'Lithium Battery', 'Lead Acid Battery', 'NiCad Battery'],
+        'color': '#FF3300',
+        'gradient': 'linear-gradient(135deg, #FF3300 0%, #FF6666 100%)',
+        'co2': 0.5,
+        'icon': '🔋',
+        'category': 'Battery'
+    },
+    'clothes': {
+        'subtypes': ['Cotton Fabric', 'Polyester Fabric', 'Mixed Fabric', 'Wool Fabric'],
+        'color': '#9933CC',
+        'gradient': 'linear-gradient(135deg, #9933CC 0%, #CC66FF 100%)',
+        'co2': 1.2,
+        'icon': '👕',
+        'category': 'Fabric'
+    },
+    'trash': {
+        'subtypes': ['General Waste', 'Organic Waste', 'Mixed Trash'],
+        'color': '#666666',
+        'gradient': 'linear-gradient(135deg, #666666 0%, #999999 100%)',
+        'co2': 0.1,
+        'icon': '🗑️',
+        'category': 'Non-Recyclable'
+    }
+}
+
+CLASS_INFO_FIELDS = ('subtypes', 'color', 'gradient', 'co2', 'icon', 'category')
+
+RECYCLABLE_KEYWORDS = ['recyclable', 'recycle', 'cardboard', 'paper', 'metal', 'glass', 'plastic', 'bottle', 'can']
+
+
+def load_class_info(path):
+    """A class_info table from a JSON file with the same shape as CLASS_INFO"""
+    with open(path, encoding="utf-8") as f:
+        return validate_class_info(json.load(f))
+
+
+def validate_class_info(class_info):
+    """Raise ValueError unless every entry has the fields the pages and API read"""
+    for key in ('plastic', 'trash'):  # match_class_info falls back to these
+        if key not in class_info:
+            raise ValueError(f"class_info needs a {key!r} entry")
+    for key, info in class_info.items():
+        missing = [field for field in CLASS_INFO_FIELDS if field not in info]
+        if missing:
+            raise ValueError(f"class_info[{key!r}] is missing {', '.join(missing)}")
+        if not info['subtypes']:
+            raise ValueError(f"class_info[{key!r}] has no subtypes")
+    return class_info
+
+
+def match_class_info(predicted_class, class_info=CLASS_INFO):
+    """Map a predicted class name to its (class_info key, class_info entry)"""
+    # Find matching class info (fuzzy match)
+    class_lower = predicted_class.lower()
+    for key, info in class_info.items():
+        if key in class_lower:
+            return key, info
+    
+    # Default fallback
+    is_recyclable = any(keyword.lower() in class_lower for keyword in RECYCLABLE_KEYWORDS)
+    if is_recyclable:
+        return 'plastic', class_info['plastic']  # Default to plastic for recyclables
+    return 'trash', class_info['trash']
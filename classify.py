@@ -0,0 +1,230 @@
+# classify.py
+"""Bulk offline classification of an image directory tree, resumable.
+
+    python classify.py /data/bins --out bins.csv
+    python classify.py /data/bins --out bins.jsonl --workers 8 --batch-size 128
+    python classify.py data/test --imagefolder --out test.parquet
+
+Images are decoded and preprocessed in a process pool while the previous
+batch runs through the model (the same engine settings as the server).
+Rows are streamed to CSV, JSONL or Parquet (a directory of part files):
+path, predicted class, confidence, class_info key/category/CO2 and one
+probability column per class.
+
+Progress is checkpointed to ``<out>.progress`` after every
+``--checkpoint-every`` images; rerunning the same command skips every file
+already written, and output past the last checkpoint is discarded first.
+"""
+import argparse, csv, json, os, sys, time
+import torch
+import catalog, config, engines, imaging
+from workers import make_executor, prefetch
+
+try:
+    import pyarrow as pa  # optional: Parquet output
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+def _fieldnames(classes, labeled):
+    return (["path"] + (["label"] if labeled else [])
+            + ["class", "confidence", "class_key", "category", "recyclable", "co2"]
+            + [f"prob_{c}" for c in classes] + ["error"])
+
+
+class _TextWriter:
+    """CSV or JSONL appended to one file; the checkpoint is its committed size."""
+
+    def __init__(self, path, fieldnames, fmt, state):
+        mode = "r+" if state and os.path.exists(path) else "w"
+        self.f = open(path, mode, newline="" if fmt == "csv" else None, encoding="utf-8")
+        self.f.seek(0)
+        self.f.truncate(state["bytes"] if state else 0)
+        self.f.seek(0, os.SEEK_END)
+        self.csv = csv.DictWriter(self.f, fieldnames) if fmt == "csv" else None
+        if self.csv is not None and self.f.tell() == 0:
+            self.csv.writeheader()
+
+    def write(self, rows):
+        if self.csv is not None:
+            self.csv.writerows(rows)
+        else:
+            self.f.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def commit(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return {"bytes": self.f.tell()}
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetWriter:
+    """A directory of part files, one per checkpoint; the checkpoint is the part count."""
+
+    def __init__(self, path, fieldnames, state):
+        if pa is None:
+            raise RuntimeError("Parquet output needs the pyarrow package")
+        self.path = path
+        self.schema = pa.schema([
+            (name, pa.float64() if name in ("confidence", "co2") or name.startswith("prob_")
+             else pa.bool_() if name == "recyclable" else pa.string())
+            for name in fieldnames
+        ])
+        self.parts = state["parts"] if state else 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            # Parts written after the last checkpoint are redone
+            if name.startswith("part-") and (name.endswith(".tmp") or int(name[5:10]) >= self.parts):
+                os.remove(os.path.join(path, name))
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def commit(self):
+        if self.rows:
+            table = pa.Table.from_pylist(self.rows, schema=self.schema)
+            part = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+            pq.write_table(table, part + ".tmp")
+            os.replace(part + ".tmp", part)
+            self.parts += 1
+            self.rows = []
+        return {"parts": self.parts}
+
+    def close(self):
+        pass
+
+
+def _output_format(path, fmt):
+    if fmt:
+        return fmt
+    for suffix, name in ((".csv", "csv"), (".jsonl", "jsonl"), (".ndjson", "jsonl"), (".parquet", "parquet")):
+        if path.lower().endswith(suffix):
+            return name
+    raise ValueError(f"Can't tell the output format of {path}; pass --format")
+
+
+def read_progress(path):
+    """(files already written, writer state at the last checkpoint) from a progress file.
+
+    A torn last line (a crash mid-checkpoint) is cut off so appends start clean.
+    """
+    done, state = set(), None
+    if os.path.exists(path):
+        with open(path, "r+b") as f:
+            good = 0
+            for line in f:
+                try:
+                    entry = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    entry = None
+                if entry is None:
+                    break  # that checkpoint never completed
+                done.update(entry["paths"])
+                state = entry["state"]
+                good += len(line)
+            f.truncate(good)
+    return done, state
+
+
+def _rows(chunk, futures, engine, classes, class_info, root, labeled):
+    rows, tensors, slots = [], [], []
+    for path, future in zip(chunk, futures):
+        rel = os.path.relpath(path, root)
+        row = {"path": rel}
+        if labeled:
+            row["label"] = rel.split(os.sep, 1)[0]
+        try:
+            tensors.append(future.result())
+            slots.append(len(rows))
+        except Exception as exc:
+            row["error"] = f"{type(exc).__name__}: {exc}"
+        rows.append(row)
+    if tensors:
+        x = torch.stack(tensors)
+        if x.dtype == torch.uint8:
+            x = imaging.normalize(x)
+        _, logits = engine(x)
+        probs = logits.float().softmax(dim=-1)
+        for slot, p in zip(slots, probs):
+            idx = int(p.argmax())
+            matched_key, info = catalog.match_class_info(classes[idx], class_info)
+            rows[slot].update({
+                "class": classes[idx],
+                "confidence": round(float(p[idx]), 6),
+                "class_key": matched_key,
+                "category": info["category"],
+                "recyclable": matched_key != "trash",
+                "co2": info["co2"],
+                **{f"prob_{c}": round(float(v), 6) for c, v in zip(classes, p)},
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify every image under a directory")
+    parser.add_argument("root", help="directory tree of images")
+    parser.add_argument("--out", required=True, help="output .csv, .jsonl or .parquet")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"])
+    parser.add_argument("--imagefolder", action="store_true",
+                        help="root/<label>/...: add the top-level folder as a label column")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=config.CPU_SHARE, help="decode processes")
+    parser.add_argument("--checkpoint-every", type=int, default=2048, help="images between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="ignore earlier progress and start over")
+    args = parser.parse_args(argv)
+
+    fmt = _output_format(args.out, args.format)
+    progress_path = args.out + ".progress"
+    if args.restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+    done, state = read_progress(progress_path)
+
+    root = os.path.abspath(args.root)
+    paths = [p for p in imaging.list_images(root) if os.path.relpath(p, root) not in done]
+    print(f"{len(paths)} images to classify ({len(done)} already done)")
+    if not paths:
+        return 0
+
+    clip_model, head, preprocess, meta, engine = engines.from_config()
+    classes, class_info = meta["classes"], meta["class_info"]
+
+    fieldnames = _fieldnames(classes, args.imagefolder)
+    if fmt == "parquet":
+        writer = _ParquetWriter(args.out, fieldnames, state)
+    else:
+        writer = _TextWriter(args.out, fieldnames, fmt, state)
+    executor = make_executor("process", args.workers, preprocess)
+    started, written, uncommitted = time.perf_counter(), 0, []
+    try:
+        with open(progress_path, "a", encoding="utf-8") as progress:
+            def checkpoint():
+                entry = {"state": writer.commit(), "paths": uncommitted}
+                progress.write(json.dumps(entry) + "\n")
+                progress.flush()
+                os.fsync(progress.fileno())
+                uncommitted.clear()
+
+            for chunk, futures in prefetch(executor, imaging.load_file, paths, args.batch_size):
+                rows = _rows(chunk, futures, engine, classes, class_info, root, args.imagefolder)
+                writer.write([{k: row.get(k) for k in fieldnames} for row in rows])
+                uncommitted.extend(row["path"] for row in rows)
+                written += len(rows)
+                if len(uncommitted) >= args.checkpoint_every:
+                    checkpoint()
+                    rate = written / (time.perf_counter() - started)
+                    print(f"  {written}/{len(paths)} images, {rate:.1f} images/s", flush=True)
+            checkpoint()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+    elapsed = time.perf_counter() - started
+    print(f"wrote {written} rows to {args.out} in {elapsed:.1f}s ({written / elapsed:.1f} images/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# config.py
+"""Server settings, read once from RECYCLER_* environment variables."""
+import os
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Server processes on this box (serve.py sets it); each worker takes an equal share of the cores
+WORKERS = max(1, _int("RECYCLER_WORKERS", 1))
+CPU_SHARE = max(1, _cpus() // WORKERS)
+TORCH_THREADS = _int("RECYCLER_TORCH_THREADS", CPU_SHARE)
+
+
+CHECKPOINT_PATH = os.environ.get("RECYCLER_CHECKPOINT", "recycler_mlp.pth")
+# Pre-converted model bundle (python bundle.py build); when set it replaces the checkpoint + clip.load
+BUNDLE_PATH = os.environ.get("RECYCLER_BUNDLE", "")
+BUNDLE_VERIFY = os.environ.get("RECYCLER_BUNDLE_VERIFY", "0") == "1"
+
+# Inference backend: "torch" (eager) or "onnx" (ONNX Runtime, exported on first start)
+ENGINE = os.environ.get("RECYCLER_ENGINE", "torch")
+ORT_THREADS = _int("RECYCLER_ORT_THREADS", CPU_SHARE)
+# Numeric precision: "fp32", "int8" (dynamic quantization) or "bf16" (CPU autocast, torch only)
+PRECISION = os.environ.get("RECYCLER_PRECISION", "fp32")
+# Torch engine graph mode: "none" (eager), "script" (traced + frozen TorchScript) or "compile" (torch.compile)
+COMPILE = os.environ.get("RECYCLER_COMPILE", "none")
+# class_info table as JSON (empty: the checkpoint's own, else catalog.CLASS_INFO); hot-reloaded like the head
+CLASS_INFO_PATH = os.environ.get("RECYCLER_CLASS_INFO", "")
+# Hot reload: seconds between checks of the checkpoint/class_info files (0 disables), and the
+# bearer token for POST /admin/reload (empty disables the endpoint)
+RELOAD_WATCH_S = _float("RECYCLER_RELOAD_WATCH_S", 2.0)
+RELOAD_TOKEN = os.environ.get("RECYCLER_RELOAD_TOKEN", "")
+# Derived model artifacts (exported graphs, caches) live here
+ARTIFACT_DIR = os.environ.get("RECYCLER_ARTIFACT_DIR", "artifacts")
+
+# Micro-batching of concurrent /predict calls
+MAX_BATCH_SIZE = _int("RECYCLER_MAX_BATCH_SIZE", 16)
+MAX_WAIT_MS = _float("RECYCLER_MAX_WAIT_MS", 5.0)
+
+# Batch sizes run once at startup before the app reports ready (empty disables warmup)
+_default_warmup = sorted({1 << i for i in range(MAX_BATCH_SIZE.bit_length()) if 1 << i <= MAX_BATCH_SIZE} | {MAX_BATCH_SIZE})
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.environ.get(
+        "RECYCLER_WARMUP_BATCH_SIZES", ",".join(map(str, _default_warmup))
+    ).split(",") if size.strip()
+]
+
+# Decode/preprocess/preview run off the event loop in this pool ("thread" or "process")
+EXECUTOR_KIND = os.environ.get("RECYCLER_EXECUTOR", "thread")
+EXECUTOR_WORKERS = _int("RECYCLER_EXECUTOR_WORKERS", CPU_SHARE)
+
+# Preprocessing: "clip" (reference torchvision transform) or "fast" (draft decode + batched normalize)
+PREPROCESS_MODE = os.environ.get("RECYCLER_PREPROCESS", "clip")
+
+# Result-page preview: thumbnail bound/quality, and "inline" (data: URI) or "url" (GET /preview/<token>)
+PREVIEW_SIZE = _int("RECYCLER_PREVIEW_SIZE", 256)
+PREVIEW_QUALITY = _int("RECYCLER_PREVIEW_QUALITY", 80)
+PREVIEW_MODE = os.environ.get("RECYCLER_PREVIEW_MODE", "inline")
+PREVIEW_TTL_S = _float("RECYCLER_PREVIEW_TTL_S", 300.0)
+
+# Admission control: requests beyond this many in flight get 429 + Retry-After
+MAX_PENDING = _int("RECYCLER_MAX_PENDING", 64)
+RETRY_AFTER_S = _int("RECYCLER_RETRY_AFTER_S", 1)
+
+# POST /api/v1/predict/batch: max images per request, and how many are decoded/queued at once
+MAX_BATCH_FILES = _int("RECYCLER_MAX_BATCH_FILES", 1000)
+BATCH_CONCURRENCY = _int("RECYCLER_BATCH_CONCURRENCY", 64)
+
+# Upload limits, answered with 413: bytes per image upload (also per stream frame and archive member), bytes
+# per batch request (uploads and expanded archives together), and pixels per image, checked before decoding
+MAX_UPLOAD_BYTES = _int("RECYCLER_MAX_UPLOAD_BYTES", 20 << 20)
+MAX_BATCH_BYTES = _int("RECYCLER_MAX_BATCH_BYTES", 256 << 20)
+MAX_PIXELS = _int("RECYCLER_MAX_PIXELS", 64_000_000)
+
+# Prediction cache: entries (0 disables), TTL, and max dHash bit distance for near-duplicate hits (-1 disables)
+CACHE_ENTRIES = _int("RECYCLER_CACHE_ENTRIES", 4096)
+CACHE_TTL_S = _float("RECYCLER_CACHE_TTL_S", 3600.0)
+CACHE_PERCEPTUAL_DISTANCE = _int("RECYCLER_CACHE_PERCEPTUAL_DISTANCE", -1)
+
+# Directory of the persistent CLIP feature store (empty disables it)
+EMBED_STORE_DIR = os.environ.get("RECYCLER_EMBED_STORE", "")
+
+# kNN index over labeled features (python knn.py build; empty disables it): neighbours returned with each
+# API prediction, ivfpq lists probed per query, and the head confidence below which the kNN vote decides (0: never)
+KNN_INDEX_DIR = os.environ.get("RECYCLER_KNN_INDEX", "")
+KNN_K = _int("RECYCLER_KNN_K", 5)
+KNN_NPROBE = _int("RECYCLER_KNN_NPROBE", 8)
+KNN_FALLBACK = _float("RECYCLER_KNN_FALLBACK", 0.0)
+
+# WebSocket frame streams (/ws/stream): open connections per worker, and the mean absolute difference
+# (0-255 grayscale, 32x32 copy) to the last classified frame below which a frame is skipped as unchanged
+STREAM_MAX_CONNECTIONS = _int("RECYCLER_STREAM_MAX_CONNECTIONS", 64)
+STREAM_DIFF_THRESHOLD = _float("RECYCLER_STREAM_DIFF_THRESHOLD", 4.0)
+
+# Cascade: a cheaper first-stage model (checkpoint or bundle with the same classes; empty disables it) that
+# answers when its top-2 softmax margin reaches the threshold; python cascade.py calibrate picks one
+CASCADE_MODEL = os.environ.get("RECYCLER_CASCADE_MODEL", "")
+CASCADE_THRESHOLD = _float("RECYCLER_CASCADE_THRESHOLD", 0.5)
+
+# Per-stage latency histograms and counters at GET /metrics (0 turns both off)
+METRICS = os.environ.get("RECYCLER_METRICS", "1") == "1"
@@ -0,0 +1,101 @@
+# embstore.py
+"""Persistent, memory-mapped store of normalized CLIP image features keyed by content hash.
+
+Layout of the store directory:
+    meta.json    {"model": clip name, "dim": feature size}
+    vectors.f16  float16 matrix, one row per image, grown in chunks
+    index.txt    one content key per line; line n owns row n
+"""
+import json, os
+import numpy as np
+
+
+class EmbeddingStore:
+    def __init__(self, root, dim, model_name, growth=4096):
+        self.root = root
+        self.dim = int(dim)
+        self.model_name = model_name
+        self.growth = growth
+        os.makedirs(root, exist_ok=True)
+        self._check_meta()
+        self._rows = {}
+        index_path = os.path.join(root, "index.txt")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for row, line in enumerate(f):
+                    self._rows[line.rstrip("\n")] = row
+        self._index = open(index_path, "a")
+        self._vectors_path = os.path.join(root, "vectors.f16")
+        self._capacity = 0
+        self._mm = None
+        self._map(max(len(self._rows), growth))
+
+    def _check_meta(self):
+        meta_path = os.path.join(self.root, "meta.json")
+        meta = {"model": self.model_name, "dim": self.dim}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                existing = json.load(f)
+            if existing != meta:
+                raise ValueError(
+                    f"Embedding store at {self.root} holds {existing}, expected {meta}"
+                )
+        else:
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+    def _map(self, rows):
+        """(Re)map the vector file with room for at least ``rows`` rows."""
+        row_bytes = self.dim * 2
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = max(size // row_bytes, rows)
+        if capacity * row_bytes > size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        if self._mm is not None:
+            self._mm.flush()
+        self._mm = np.memmap(self._vectors_path, dtype=np.float16, mode="r+",
+                             shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def get(self, key):
+        """The stored feature for ``key`` as a float32 array, or None."""
+        row = self._rows.get(key)
+        return None if row is None else np.asarray(self._mm[row], dtype=np.float32)
+
+    def add(self, key, vector):
+        if key in self._rows:
+            return self._rows[key]
+        row = len(self._rows)
+        if row >= self._capacity:
+            self._map(self._capacity + self.growth)
+        self._mm[row] = np.asarray(vector, dtype=np.float16)
+        # The vector lands before its index line, so a crash never indexes garbage
+        self._index.write(key + "\n")
+        self._index.flush()
+        self._rows[key] = row
+        return row
+
+    def keys(self):
+        """Content keys in row order."""
+        return sorted(self._rows, key=self._rows.get)
+
+    def vectors(self):
+        """Read-only view of all stored rows, shape [len(self), dim]."""
+        view = self._mm[: len(self._rows)]
+        view.flags.writeable = False
+        return view
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+        self._index.close()
+
+    def stats(self):
+        return {"vectors": len(self._rows), "capacity": self._capacity, "dim": self.dim}
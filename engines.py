@@ -0,0 +1,360 @@
+# engines.py
+"""Inference engines: CLIP image tower + L2 normalize + MLP head behind one call.
+
+An engine takes a normalized image batch [B, 3, H, W] and returns
+(features, logits) on the CPU. ``score`` runs the head alone on stored
+features. ``make_engine`` picks the backend named by RECYCLER_ENGINE;
+``from_config`` loads the configured model and engine the way every entry
+point (server, features.py, classify.py, cascade.py) does.
+"""
+import argparse, hashlib, inspect, os, sys
+import torch
+from torch import nn
+
+try:
+    import onnxruntime as ort  # optional: RECYCLER_ENGINE=onnx
+except ImportError:
+    ort = None
+
+PRECISIONS = ("fp32", "int8", "bf16")
+COMPILE_MODES = ("none", "script", "compile")
+
+
+def load_checkpoint(path):
+    return torch.load(path, map_location="cpu")
+
+
+def build_head(ckpt, device="cpu"):
+    """The MLP head described by a recycler_mlp.pth-style checkpoint, in eval mode"""
+    mlp = nn.Sequential(
+        nn.Linear(ckpt["in_dim"], ckpt["mlp_hidden"]),
+        nn.ReLU(),
+        nn.Dropout(0.2),
+        nn.Linear(ckpt["mlp_hidden"], len(ckpt["classes"])),
+    ).to(device)
+    mlp.load_state_dict(ckpt["mlp_state"])
+    mlp.eval()
+    return mlp
+
+
+def file_digest(path, length=12):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:length]
+
+
+class ImageClassifier(nn.Module):
+    """encode_image -> L2 normalize -> head as a single module returning (features, logits)"""
+
+    def __init__(self, visual, head):
+        super().__init__()
+        self.visual = visual
+        self.head = head
+
+    def forward(self, x):
+        feat = self.visual(x.type(self.visual.conv1.weight.dtype))
+        feat = feat / feat.norm(dim=-1, keepdim=True)
+        feat = feat.float()  # the head is always fp32 (or int8 with fp32 activations)
+        return feat, self.head(feat)
+
+
+class TorchEngine:
+    name = "torch"
+
+    def __init__(self, classifier, head, device="cpu", autocast_dtype=None):
+        self.classifier = classifier
+        self.head = head
+        self.device = device
+        self.autocast_dtype = autocast_dtype
+
+    def __call__(self, x):
+        with torch.no_grad(), torch.autocast(
+            torch.device(self.device).type,
+            dtype=self.autocast_dtype,
+            enabled=self.autocast_dtype is not None,
+        ):
+            feat, logits = self.classifier(x.to(self.device))
+        return feat.float().cpu(), logits.float().cpu()
+
+    def score(self, feat):
+        with torch.no_grad():
+            logits = self.head(torch.as_tensor(feat, dtype=torch.float32).to(self.device))
+        return logits.float().cpu()
+
+
+class OrtEngine:
+    """ONNX Runtime session over the exported ImageClassifier graph"""
+
+    name = "onnx"
+
+    def __init__(self, path, head, threads=0):
+        if ort is None:
+            raise RuntimeError("RECYCLER_ENGINE=onnx needs the onnxruntime package")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.path = path
+        self.head = head.cpu()
+
+    def __call__(self, x):
+        feat, logits = self.session.run(
+            ["features", "logits"], {"image": x.float().cpu().numpy()}
+        )
+        return torch.from_numpy(feat), torch.from_numpy(logits)
+
+    def score(self, feat):
+        with torch.no_grad():
+            return self.head(torch.as_tensor(feat, dtype=torch.float32))
+
+
+def quantize_int8(classifier):
+    """Dynamic INT8 quantization of every nn.Linear (ViT MLPs and the head), in place"""
+    return torch.ao.quantization.quantize_dynamic(
+        classifier, {nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def quantize_onnx_int8(path):
+    """INT8 weight-quantized copy of an exported graph, written next to it"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out = path[: -len(".onnx")] + "-int8.onnx"
+    if not os.path.exists(out):
+        quantize_dynamic(path, out + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(out + ".tmp", out)
+    return out
+
+
+def compile_classifier(classifier, mode, n_px=224, device="cpu", autocast_dtype=None,
+                       artifact_dir=None, tag="model"):
+    """Trace-and-freeze ("script") or torch.compile ("compile") the fused classifier.
+
+    The frozen TorchScript graph is cached as <artifact_dir>/<tag>.ts and
+    reused on the next start; torch.compile keeps its inductor cache under
+    <artifact_dir>/inductor.
+    """
+    if mode == "none":
+        return classifier
+    if mode == "script":
+        path = os.path.join(artifact_dir, f"{tag}.ts") if artifact_dir else None
+        if path and os.path.exists(path):
+            frozen = torch.jit.load(path, map_location=device)
+        else:
+            example = torch.zeros(2, 3, n_px, n_px, device=device)
+            with torch.no_grad(), torch.autocast(
+                torch.device(device).type, dtype=autocast_dtype, enabled=autocast_dtype is not None
+            ):
+                frozen = torch.jit.freeze(torch.jit.trace(classifier.eval(), example, check_trace=False))
+            if path:
+                os.makedirs(artifact_dir, exist_ok=True)
+                torch.jit.save(frozen, path + ".tmp")
+                os.replace(path + ".tmp", path)
+        # Backend-specific rewrites happen after loading; their output can't be serialized
+        return torch.jit.optimize_for_inference(frozen)
+    if mode == "compile":
+        if artifact_dir:
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(artifact_dir, "inductor"))
+        return torch.compile(classifier, dynamic=True)
+    raise ValueError(f"Unknown compile mode {mode!r} (expected one of {COMPILE_MODES})")
+
+
+def warmup(engine, batch_sizes):
+    """Run every batch size once so the first real requests hit warm kernels and caches"""
+    for size in batch_sizes:
+        engine(torch.zeros(size, 3, engine.n_px, engine.n_px))
+
+
+def export_onnx(classifier, path, n_px=224, opset=17):
+    """Export the fused classifier with a dynamic batch dimension."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    classifier = classifier.float().cpu().eval()
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False  # the TorchScript exporter handles dynamic_axes directly
+    tmp = path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            classifier,
+            (torch.zeros(1, 3, n_px, n_px),),
+            tmp,
+            input_names=["image"],
+            output_names=["features", "logits"],
+            dynamic_axes={"image": {0: "batch"}, "features": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=opset,
+            **kwargs,
+        )
+    os.replace(tmp, path)
+    return path
+
+
+def artifact_tag(ckpt, checkpoint_path):
+    """Name for derived artifacts, unique per CLIP model and head checkpoint"""
+    return f"{ckpt['clip_name'].replace('/', '-')}-{file_digest(checkpoint_path)}"
+
+
+def load_model(device="cpu", checkpoint_path=None, bundle_path=None):
+    """Load the configured model: a bundle when one is given, else checkpoint + clip.load.
+
+    Returns (clip_model, head, preprocess, meta). ``meta`` carries the
+    checkpoint keys (classes, clip_name, in_dim, mlp_hidden), ``class_info``,
+    an artifact ``tag`` and the ``path`` whose changes mean a new model.
+    """
+    import catalog, config, imaging
+
+    checkpoint_path = checkpoint_path or config.CHECKPOINT_PATH
+    bundle_path = config.BUNDLE_PATH if bundle_path is None else bundle_path
+    if bundle_path:
+        import bundle
+
+        # Pre-converted bundle: mmap-backed weights, no CLIP download or unpickling
+        clip_model, head, meta = bundle.load(bundle_path, device, full_verify=config.BUNDLE_VERIFY)
+        preprocess = imaging.clip_preprocess(clip_model.visual.input_resolution)
+        meta = dict(meta, path=os.path.join(bundle_path, "manifest.json"))
+    else:
+        import clip
+
+        ckpt = load_checkpoint(checkpoint_path)
+        clip_model, preprocess = clip.load(ckpt["clip_name"], device=device)
+        clip_model.eval()
+        head = build_head(ckpt, device)
+        meta = {key: ckpt[key] for key in ("classes", "clip_name", "in_dim", "mlp_hidden")}
+        meta.update(
+            class_info=ckpt.get("class_info", catalog.CLASS_INFO),
+            tag=artifact_tag(ckpt, checkpoint_path),
+            path=checkpoint_path,
+        )
+    return clip_model, head, preprocess, meta
+
+
+def load_head(path, device="cpu"):
+    """Only the classifier head (and its metadata) from a checkpoint file or a bundle directory."""
+    if os.path.isdir(path):
+        import bundle
+
+        return bundle.load_head(path, device)
+    ckpt = load_checkpoint(path)
+    meta = {key: ckpt[key] for key in ("classes", "clip_name", "in_dim", "mlp_hidden")}
+    meta.update(class_info=ckpt.get("class_info"), tag=artifact_tag(ckpt, path))
+    return build_head(ckpt, device), meta
+
+
+def make_engine(kind, clip_model, head, device="cpu", artifact_dir="artifacts", tag="model",
+                ort_threads=0, precision="fp32", compile_mode="none"):
+    """Build the configured engine.
+
+    ``precision`` is "fp32", "int8" (dynamic quantization of Linear layers,
+    CPU only) or "bf16" (torch CPU autocast; fastest on CPUs with AVX512-BF16
+    or AMX). INT8 quantizes ``clip_model`` and ``head`` in place.
+    ``compile_mode`` applies to the torch engine only, see compile_classifier.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r} (expected one of {PRECISIONS})")
+    n_px = clip_model.visual.input_resolution
+    classifier = ImageClassifier(clip_model.visual, head).eval()
+    if kind == "torch":
+        autocast_dtype = torch.bfloat16 if precision == "bf16" else None
+        if precision == "int8":
+            if torch.device(device).type != "cpu":
+                raise ValueError("INT8 dynamic quantization only runs on the CPU")
+            classifier = quantize_int8(classifier)
+        classifier = compile_classifier(
+            classifier, compile_mode, n_px, device, autocast_dtype,
+            artifact_dir=artifact_dir, tag=f"{tag}-{precision}",
+        )
+        engine = TorchEngine(classifier, head, device, autocast_dtype)
+    elif kind == "onnx":
+        if precision == "bf16":
+            raise ValueError("bf16 is only available with RECYCLER_ENGINE=torch")
+        path = os.path.join(artifact_dir, f"{tag}.onnx")
+        if not os.path.exists(path):
+            export_onnx(classifier, path, n_px)
+        if precision == "int8":
+            path = quantize_onnx_int8(path)
+        engine = OrtEngine(path, head, ort_threads)
+    else:
+        raise ValueError(f"Unknown engine {kind!r} (expected 'torch' or 'onnx')")
+    engine.n_px = n_px
+    return engine
+
+
+def default_device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def engine_from_config(clip_model, head, tag, device="cpu"):
+    """make_engine with the RECYCLER_ENGINE, _ORT_THREADS, _PRECISION and _COMPILE settings"""
+    import config
+
+    return make_engine(
+        config.ENGINE, clip_model, head, device, artifact_dir=config.ARTIFACT_DIR, tag=tag,
+        ort_threads=config.ORT_THREADS, precision=config.PRECISION, compile_mode=config.COMPILE,
+    )
+
+
+def from_config(device=None, build_engine=True, checkpoint_path=None):
+    """(clip_model, head, preprocess, meta, engine) for the configured model.
+
+    Sizes torch's intra-op threads to this process's share of the cores and
+    loads the model as load_model does; ``checkpoint_path`` replaces
+    RECYCLER_BUNDLE / RECYCLER_CHECKPOINT. ``preprocess`` is FastPreprocess with
+    RECYCLER_PREPROCESS=fast. ``engine`` is None without ``build_engine``.
+    """
+    import config, imaging
+
+    device = device or default_device()
+    torch.set_num_threads(config.TORCH_THREADS)
+    clip_model, head, preprocess, meta = load_model(
+        device, checkpoint_path, bundle_path="" if checkpoint_path else None
+    )
+    engine = engine_from_config(clip_model, head, meta["tag"], device) if build_engine else None
+    if config.PREPROCESS_MODE == "fast":
+        preprocess = imaging.FastPreprocess(clip_model.visual.input_resolution)
+    return clip_model, head, preprocess, meta, engine
+
+
+def _parity(argv=None):
+    """Check the ONNX Runtime engine against eager torch on a folder of images."""
+    import clip
+    import config, imaging
+
+    parser = argparse.ArgumentParser(description=_parity.__doc__)
+    parser.add_argument("folder")
+    parser.add_argument("--checkpoint", default=config.CHECKPOINT_PATH)
+    parser.add_argument("--artifact-dir", default=config.ARTIFACT_DIR)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--atol", type=float, default=1e-3, help="max allowed |logits| difference")
+    args = parser.parse_args(argv)
+
+    ckpt = load_checkpoint(args.checkpoint)
+    clip_model, preprocess = clip.load(ckpt["clip_name"], device="cpu")
+    clip_model.eval()
+    head = build_head(ckpt)
+    tag = artifact_tag(ckpt, args.checkpoint)
+    reference = make_engine("torch", clip_model, head)
+    candidate = make_engine("onnx", clip_model, head, artifact_dir=args.artifact_dir, tag=tag)
+
+    paths = imaging.list_images(args.folder)
+    feat_diff = logit_diff = 0.0
+    agree = 0
+    for start in range(0, len(paths), args.batch_size):
+        batch = []
+        for path in paths[start:start + args.batch_size]:
+            with open(path, "rb") as f:
+                batch.append(preprocess(imaging.decode_image(f.read())))
+        x = torch.stack(batch)
+        ref_feat, ref_logits = reference(x)
+        feat, logits = candidate(x)
+        feat_diff = max(feat_diff, (feat - ref_feat).abs().max().item())
+        logit_diff = max(logit_diff, (logits - ref_logits).abs().max().item())
+        agree += (logits.argmax(1) == ref_logits.argmax(1)).sum().item()
+    print(f"{len(paths)} images via {candidate.path}: top-1 agreement {agree}/{len(paths)}, "
+          f"max |feature diff| {feat_diff:.2e}, max |logit diff| {logit_diff:.2e}")
+    return 0 if paths and agree == len(paths) and logit_diff <= args.atol else 1
+
+
+if __name__ == "__main__":
+    sys.exit(_parity())
@@ -0,0 +1,136 @@
+# evaluate.py
+"""Accuracy-parity harness for reduced-precision inference.
+
+Scores a labeled ImageFolder (data/<class>/<image>) with the served model
+(RECYCLER_BUNDLE or the checkpoint, preprocessed as RECYCLER_PREPROCESS says)
+on the fp32 engine and on a reduced-precision one, then reports accuracy,
+the accuracy drop, top-1 agreement and latency:
+
+    python evaluate.py data/test --precision int8
+    python evaluate.py data/test --precision bf16 --max-drop 0.005
+    python evaluate.py --features features/test --precision int8
+
+With ``--features`` the stored features of a features.py directory are
+streamed through the head alone, so only the head's reduced precision is
+measured and no image is decoded or encoded.
+"""
+import argparse, copy, sys, time
+from concurrent.futures import ThreadPoolExecutor
+import torch
+import config, engines, imaging
+
+
+def _load(path, preprocess):
+    with open(path, "rb") as f:
+        return preprocess(imaging.decode_image(f.read(), getattr(preprocess, "draft_size", None)))
+
+
+def _image_batches(samples, preprocess, classes, batch_size):
+    """(preprocessed images, target class indices, -1 for unknown labels) per batch."""
+    with ThreadPoolExecutor() as pool:
+        for start in range(0, len(samples), batch_size):
+            chunk = samples[start:start + batch_size]
+            x = torch.stack(list(pool.map(lambda s: _load(s[0], preprocess), chunk)))
+            if x.dtype == torch.uint8:
+                x = imaging.normalize(x)
+            yield x, torch.tensor([classes.index(label) if label in classes else -1 for _, label in chunk])
+
+
+def _head_scorer(head, precision):
+    """Logits of stored features under ``precision``, with the head as the image engines run it."""
+    if precision == "int8":
+        head = engines.quantize_int8(head)
+
+    def score(feat):
+        with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=precision == "bf16"):
+            return head(feat).float()
+    return score
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare fp32 against a reduced precision mode")
+    parser.add_argument("folder", nargs="?", help="ImageFolder layout: one sub-folder per class")
+    parser.add_argument("--features", help="features.py directory to score instead of a folder of images")
+    parser.add_argument("--precision", default=config.PRECISION if config.PRECISION != "fp32" else "int8",
+                        choices=[p for p in engines.PRECISIONS if p != "fp32"])
+    parser.add_argument("--engine", default=config.ENGINE, choices=["torch", "onnx"],
+                        help="image engine (the head always runs in torch with --features)")
+    parser.add_argument("--checkpoint", help="head checkpoint (default: the served model, "
+                                             "RECYCLER_BUNDLE or RECYCLER_CHECKPOINT)")
+    parser.add_argument("--artifact-dir", default=config.ARTIFACT_DIR)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-drop", type=float, default=0.01,
+                        help="fail if accuracy drops by more than this (absolute)")
+    args = parser.parse_args(argv)
+    if (args.folder is None) == (args.features is None):
+        parser.error("pass either a folder of images or --features")
+
+    if args.features:
+        import features
+
+        head, meta = engines.load_head(args.checkpoint or config.BUNDLE_PATH or config.CHECKPOINT_PATH)
+        classes = meta["classes"]
+        reader = features.FeatureShards(args.features)
+        if (reader.model, reader.dim) != (meta["clip_name"], meta["in_dim"]):
+            parser.error(f"{args.features} holds {reader.model} {reader.dim}-d features, "
+                         f"the head expects {meta['clip_name']} {meta['in_dim']}-d")
+        if not len(reader):
+            parser.error(f"no features in {args.features}")
+        unknown = sorted(set(reader.classes) - set(classes))
+        scorers = {"fp32": _head_scorer(head, "fp32"),
+                   args.precision: _head_scorer(copy.deepcopy(head), args.precision)}
+        batches = ((X, y) for X, y, _ in reader.iter_batches(args.batch_size, classes))
+        source = f"stored features of {args.features}"
+    else:
+        samples = imaging.image_folder(args.folder)
+        if not samples:
+            parser.error(f"no labeled images under {args.folder}")
+        # The served model and preprocess: RECYCLER_BUNDLE and RECYCLER_PREPROCESS apply
+        clip_model, head, preprocess, meta, _ = engines.from_config(
+            "cpu", build_engine=False, checkpoint_path=args.checkpoint
+        )
+        classes = meta["classes"]
+
+        def engine(clip_model, head, precision):
+            return engines.make_engine(
+                args.engine, clip_model, head, artifact_dir=args.artifact_dir, tag=meta["tag"],
+                ort_threads=config.ORT_THREADS, precision=precision, compile_mode=config.COMPILE,
+            )
+
+        # Quantization works in place, so the reduced engine gets its own copy of the weights
+        reduced = engine(copy.deepcopy(clip_model), copy.deepcopy(head), args.precision)
+        reference = engine(clip_model, head, "fp32")
+        unknown = sorted({label for _, label in samples if label not in classes})
+        scorers = {"fp32": lambda x: reference(x)[1], args.precision: lambda x: reduced(x)[1]}
+        batches = _image_batches(samples, preprocess, classes, args.batch_size)
+        source = f"images, engine={args.engine}, preprocess={config.PREPROCESS_MODE}"
+    if unknown:
+        print(f"labels not in the checkpoint (agreement only): {', '.join(unknown)}")
+
+    correct = {"fp32": 0, args.precision: 0}
+    seconds = {"fp32": 0.0, args.precision: 0.0}
+    n = labeled = agree = 0
+    for x, targets in batches:
+        preds = {}
+        for name, score in scorers.items():
+            t0 = time.perf_counter()
+            preds[name] = score(x).argmax(dim=1)
+            seconds[name] += time.perf_counter() - t0
+        n += len(targets)
+        agree += (preds["fp32"] == preds[args.precision]).sum().item()
+        known = targets >= 0
+        labeled += int(known.sum())
+        for name in correct:
+            correct[name] += (preds[name][known] == targets[known]).sum().item()
+
+    print(f"{n} {source}, {labeled} with known labels")
+    for name in correct:
+        acc = correct[name] / labeled if labeled else float("nan")
+        print(f"  {name:>5}: accuracy {acc:.4f}  {1000 * seconds[name] / n:.1f} ms/image")
+    drop = (correct["fp32"] - correct[args.precision]) / labeled if labeled else 0.0
+    print(f"  top-1 agreement {agree}/{n} ({agree / n:.4f}), accuracy drop {drop:+.4f}")
+    return 0 if drop <= args.max_drop else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
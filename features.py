@@ -0,0 +1,264 @@
+# features.py
+"""Incremental, sharded CLIP feature extraction (the notebook's ``embed_split``, on disk).
+
+    python features.py extract data/train features/train
+    python features.py extract data/test features/test --workers 8
+    python features.py compact features/train
+    python features.py info features/train
+
+An output directory holds:
+
+    manifest.json      model, feature dim, preprocess mode, engine and
+                       precision, shard list, and per file (path relative
+                       to the image root): sha256, size, mtime, ImageFolder
+                       label, shard and row
+    shard-NNNNN.npy    float16 [rows, dim] matrices of L2-normalized features
+
+Reruns only embed files that are new or whose content changed (stat first,
+sha256 to confirm); files that disappeared drop out of the manifest. Shards
+are never rewritten in place: each run adds new ones and ``compact`` folds
+them together, dropping rows nothing points at any more.
+
+``FeatureShards`` reads a directory back through memory maps, so training
+and evaluation can stream batches without holding every feature in RAM.
+"""
+import argparse, json, os, sys, time
+import numpy as np
+import torch
+import config, engines, imaging
+from cache import content_key
+from workers import make_executor, prefetch
+
+FORMAT = "recycler-features"
+FORMAT_VERSION = 1
+
+
+def _load(path):
+    """Worker: (sha256 of the file, preprocessed tensor)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return content_key(data), imaging.prepare(data)[0]
+
+
+def _write_json(path, obj):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _write_shard(out_dir, index, rows):
+    name = f"shard-{index:05d}.npy"
+    path = os.path.join(out_dir, name)
+    np.save(path + ".tmp.npy", np.asarray(rows, dtype=np.float16))
+    os.replace(path + ".tmp.npy", path)
+    return name
+
+
+class FeatureShards:
+    """Read side of an extraction directory: labels, full arrays or streamed batches."""
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT or self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{root} is not a {FORMAT} v{FORMAT_VERSION} directory")
+        self.dim = self.manifest["dim"]
+        self.model = self.manifest["model"]
+        self.paths = sorted(self.manifest["files"])
+        self.classes = sorted({e["label"] for e in self.manifest["files"].values() if e["label"] is not None})
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def shard(self, name):
+        if name not in self._shards:
+            self._shards[name] = np.load(os.path.join(self.root, name), mmap_mode="r")
+        return self._shards[name]
+
+    def labels(self, classes=None):
+        """Class index per file (-1 when unlabeled or not in ``classes``), in ``self.paths`` order."""
+        index = {c: i for i, c in enumerate(classes or self.classes)}
+        files = self.manifest["files"]
+        return torch.tensor([index.get(files[p]["label"], -1) for p in self.paths], dtype=torch.long)
+
+    def _rows(self, paths):
+        files = self.manifest["files"]
+        out = np.empty((len(paths), self.dim), dtype=np.float32)
+        # Grouped by shard so each shard is gathered with one fancy-index read
+        by_shard = {}
+        for i, p in enumerate(paths):
+            by_shard.setdefault(files[p]["shard"], []).append((i, files[p]["row"]))
+        for name, pairs in by_shard.items():
+            dst, src = zip(*pairs)
+            out[list(dst)] = self.shard(name)[list(src)]
+        return torch.from_numpy(out)
+
+    def iter_batches(self, batch_size=4096, classes=None, shuffle=False, seed=0):
+        """Yield (features float32 [B, dim], labels long [B], paths) without loading everything."""
+        order = np.arange(len(self.paths))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        labels = self.labels(classes)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            paths = [self.paths[i] for i in idx]
+            yield self._rows(paths), labels[torch.from_numpy(idx)], paths
+
+    def load(self, classes=None):
+        """Everything at once as (X float32 [N, dim], y long [N]), like the notebook's train_emb.pt."""
+        return self._rows(self.paths), self.labels(classes)
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def extract(image_root, out_dir, batch_size=64, workers=None, shard_size=4096, log=print):
+    """Embed new or changed images under ``image_root`` into ``out_dir``; returns the manifest."""
+    workers = workers or config.CPU_SHARE
+    image_root = os.path.abspath(image_root)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+
+    device = engines.default_device()
+    clip_model, head, preprocess, meta, _ = engines.from_config(device, build_engine=False)
+    # Rows from another engine or precision differ slightly, so a rerun must not mix them in
+    expected = {"model": meta["clip_name"], "dim": meta["in_dim"], "preprocess": config.PREPROCESS_MODE,
+                "engine": config.ENGINE, "precision": config.PRECISION}
+
+    if os.path.exists(manifest_path):
+        manifest = FeatureShards(out_dir).manifest
+        found = {key: manifest.get(key) for key in expected}
+        if found != expected:
+            raise ValueError(f"{out_dir} holds features for {found}, expected {expected}")
+    else:
+        manifest = {"format": FORMAT, "format_version": FORMAT_VERSION, **expected,
+                    "shards": [], "files": {}}
+
+    files = manifest["files"]
+    current = {os.path.relpath(p, image_root): p for p in imaging.list_images(image_root)}
+    for rel in set(files) - set(current):
+        del files[rel]
+    todo = [rel for rel in sorted(current)
+            if rel not in files or _stat(current[rel]) != (files[rel]["size"], files[rel]["mtime_ns"])]
+    log(f"{len(current)} images, {len(todo)} new or modified")
+    if not todo:
+        _write_json(manifest_path, manifest)
+        return manifest
+
+    # Built only now: with nothing to embed there is no engine (or ONNX export) to pay for
+    engine = engines.engine_from_config(clip_model, head, meta["tag"], device)
+    next_shard = 1 + max((int(name[6:11]) for name in manifest["shards"]), default=-1)
+    pending, entries = [], {}
+    started, embedded, unchanged, failed = time.perf_counter(), 0, 0, 0
+
+    def flush():
+        nonlocal next_shard
+        name = _write_shard(out_dir, next_shard, pending)
+        next_shard += 1
+        for row, (rel, entry) in enumerate(entries.items()):
+            files[rel] = dict(entry, shard=name, row=row)
+        manifest["shards"].append(name)
+        _write_json(manifest_path, manifest)  # a crash before this just leaves an orphan shard
+        pending.clear()
+        entries.clear()
+
+    executor = make_executor("process", workers, preprocess)
+    try:
+        for chunk, futures in prefetch(executor, _load, [current[rel] for rel in todo], batch_size):
+            keep, tensors = [], []
+            for path, future in zip(chunk, futures):
+                rel = os.path.relpath(path, image_root)
+                try:
+                    sha, x = future.result()
+                except Exception as exc:
+                    log(f"  skipping {rel}: {type(exc).__name__}: {exc}")
+                    failed += 1
+                    files.pop(rel, None)
+                    continue
+                size, mtime_ns = _stat(path)
+                old = files.get(rel)
+                if old is not None and old["sha256"] == sha:
+                    old.update(size=size, mtime_ns=mtime_ns)  # touched, not changed
+                    unchanged += 1
+                    continue
+                label = rel.split(os.sep, 1)[0] if os.sep in rel else None
+                keep.append((rel, {"sha256": sha, "size": size, "mtime_ns": mtime_ns, "label": label}))
+                tensors.append(x)
+            if tensors:
+                x = torch.stack(tensors)
+                if x.dtype == torch.uint8:
+                    x = imaging.normalize(x)
+                feat, _ = engine(x)
+                for (rel, entry), row in zip(keep, feat.numpy()):
+                    pending.append(row)
+                    entries[rel] = entry
+                embedded += len(tensors)
+                if len(pending) >= shard_size:
+                    flush()
+                    log(f"  {embedded} embedded, {embedded / (time.perf_counter() - started):.1f} images/s")
+        if pending:
+            flush()
+        else:
+            _write_json(manifest_path, manifest)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    log(f"embedded {embedded}, unchanged {unchanged}, failed {failed} in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def compact(out_dir, shard_size=65536):
+    """Rewrite live rows into as few shards as possible and delete the rest."""
+    reader = FeatureShards(out_dir)
+    manifest = reader.manifest
+    old_shards = list(manifest["shards"])
+    next_shard = 1 + max((int(name[6:11]) for name in old_shards), default=-1)
+    new_shards, files = [], {}
+    for start in range(0, len(reader.paths), shard_size):
+        paths = reader.paths[start:start + shard_size]
+        name = _write_shard(out_dir, next_shard + len(new_shards), reader._rows(paths).numpy())
+        new_shards.append(name)
+        for row, rel in enumerate(paths):
+            files[rel] = dict(manifest["files"][rel], shard=name, row=row)
+    _write_json(os.path.join(out_dir, "manifest.json"), dict(manifest, shards=new_shards, files=files))
+    for name in os.listdir(out_dir):
+        if name.startswith("shard-") and name not in new_shards:
+            os.remove(os.path.join(out_dir, name))
+    return len(old_shards), len(new_shards)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded, incremental CLIP feature extraction")
+    sub = parser.add_subparsers(dest="command", required=True)
+    e = sub.add_parser("extract", help="embed new or changed images under a folder")
+    e.add_argument("image_root")
+    e.add_argument("out_dir")
+    e.add_argument("--batch-size", type=int, default=64)
+    e.add_argument("--workers", type=int, default=config.CPU_SHARE, help="decode processes")
+    e.add_argument("--shard-size", type=int, default=4096, help="rows per shard")
+    c = sub.add_parser("compact", help="fold shards together and drop stale rows")
+    c.add_argument("out_dir")
+    i = sub.add_parser("info", help="summarize an extraction directory")
+    i.add_argument("out_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        extract(args.image_root, args.out_dir, args.batch_size, args.workers, args.shard_size)
+    elif args.command == "compact":
+        before, after = compact(args.out_dir)
+        print(f"{args.out_dir}: {before} shards -> {after}")
+    else:
+        reader = FeatureShards(args.out_dir)
+        labels = reader.labels().numpy()
+        counts = np.bincount(labels[labels >= 0], minlength=len(reader.classes))
+        print(f"{len(reader)} features ({reader.model}, dim {reader.dim}) in {len(reader.manifest['shards'])} shards")
+        for name, count in zip(reader.classes, counts):
+            print(f"  {name}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# hotreload.py
+"""Swap the classifier head and class metadata without restarting the server.
+
+Everything that depends on the head lives in one ``ModelVersion``. Requests
+take a reference to the current version once and use it to the end, so a
+swap (a single attribute assignment) never mixes old logits with new class
+names. In-flight requests simply finish on the version they started with.
+A ``Reloader`` builds the next version in a worker thread (validating it
+and warming its engine) before the swap, so requests never wait on a
+reload. It is triggered by a file watch or by the admin endpoint.
+"""
+import asyncio, hashlib, json, os, random, time
+import catalog, engines
+from pages import ResultPages
+
+VERSION_HEADER = "X-Model-Version"
+
+
+class ModelVersion:
+    """A head, its engine and the class metadata that goes with it."""
+
+    def __init__(self, engine, head, classes, class_info, version, subtypes=None):
+        self.engine = engine
+        self.head = head
+        self.classes = classes
+        self.class_info = class_info
+        self.version = version
+        self.subtypes = subtypes
+        self.result_pages = ResultPages(class_info)
+        self.loaded_at = time.time()
+
+    def subtype(self, class_key, feat):
+        """Closest subtype by CLIP text embedding; random when there is no text index."""
+        if self.subtypes is None or feat is None:
+            return random.choice(self.class_info[class_key]['subtypes'])
+        return self.subtypes.pick(class_key, feat)
+
+
+def class_info_digest(class_info):
+    return hashlib.sha256(json.dumps(class_info, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def validate(meta, in_dim, clip_name):
+    """Raise ValueError if a new head can't replace the running one."""
+    if meta["clip_name"] != clip_name:
+        raise ValueError(f"head was trained on {meta['clip_name']}, the server runs {clip_name}")
+    if meta["in_dim"] != in_dim:
+        raise ValueError(f"head expects {meta['in_dim']}-d features, the encoder produces {in_dim}")
+    classes = meta["classes"]
+    if not classes or len(set(classes)) != len(classes) or not all(isinstance(c, str) and c for c in classes):
+        raise ValueError("classes must be a non-empty list of unique names")
+
+
+def build_version(clip_model, head, meta, class_info, make_engine, warmup_sizes=(), index_subtypes=None):
+    """Engine + metadata for ``head``; warmed up so the first request after the swap is fast."""
+    catalog.validate_class_info(class_info)
+    engine = make_engine(clip_model, head, meta["tag"])
+    engines.warmup(engine, warmup_sizes)
+    version = f"{meta['tag']}.{class_info_digest(class_info)}"
+    subtypes = index_subtypes(class_info) if index_subtypes is not None else None
+    return ModelVersion(engine, head, list(meta["classes"]), class_info, version, subtypes)
+
+
+class Reloader:
+    """Rebuilds the model version when watched files change or on request.
+
+    ``load`` is a blocking callable returning the next ``ModelVersion`` (or
+    raising); ``swap`` installs it. Reloads are serialized; a failed one
+    leaves the running version in place and is reported in ``stats``.
+    """
+
+    def __init__(self, load, swap, watch_paths=(), interval_s=2.0):
+        self.load = load
+        self.swap = swap
+        self.watch_paths = [p for p in watch_paths if p]
+        self.interval = interval_s
+        self._lock = asyncio.Lock()
+        self._stamps = {p: self._stat(p) for p in self.watch_paths}
+        self._task = None
+        self.reloads = self.failures = 0
+        self.last_error = None
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    async def start(self):
+        if self.watch_paths and self.interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            stamps = {p: self._stat(p) for p in self.watch_paths}
+            # Only reload once a changed file is present and has stopped changing
+            if stamps != self._stamps and None not in stamps.values():
+                await asyncio.sleep(self.interval)
+                if {p: self._stat(p) for p in self.watch_paths} == stamps:
+                    try:
+                        await self.reload()
+                    except Exception:
+                        pass  # recorded in stats; keep serving the current version
+
+    async def reload(self):
+        """Build and install a new version; returns it, or raises and keeps the old one."""
+        async with self._lock:
+            # The files as this load sees them: the watcher only acts on changes after this point
+            self._stamps = {p: self._stat(p) for p in self.watch_paths}
+            try:
+                version = await asyncio.to_thread(self.load)
+            except Exception as exc:
+                self.failures += 1
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                raise
+            self.swap(version)
+            self.reloads += 1
+            self.last_error = None
+            return version
+
+    def stats(self):
+        return {
+            "watching": self.watch_paths if self._task is not None else [],
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class VersionHeader:
+    """ASGI middleware: every response carries the active model version unless the handler set it."""
+
+    def __init__(self, app, current):
+        self.app = app
+        self.current = current  # () -> version string
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        header = VERSION_HEADER.lower().encode()
+
+        async def send_with_version(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if not any(name == header for name, _ in headers):
+                    headers.append((header, self.current().encode()))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
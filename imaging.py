@@ -0,0 +1,307 @@
+# imaging.py
+"""CPU-bound image stages (decode, preprocess, preview encoding).
+
+Everything here is a plain module-level function (or picklable object) so it
+can run in either a thread pool or a process pool.
+"""
+import argparse, io, os, sys, tarfile, time, zipfile
+import numpy as np
+import torch
+from PIL import Image
+import config
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".gif", ".tif", ".tiff")
+
+# CLIP's input normalization
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+_preprocess = None
+
+
+class InvalidImage(ValueError):
+    """An upload rejected before inference: not a readable image (or, as TooLarge, too big)."""
+
+
+class TooLarge(InvalidImage):
+    """An image or archive over the configured size limits."""
+
+
+def _decoding(fn, *args):
+    """``fn(*args)``, with any failure to read the image data raised as InvalidImage."""
+    try:
+        return fn(*args)
+    except InvalidImage:
+        raise
+    except Exception as exc:
+        raise InvalidImage(f"{type(exc).__name__}: {exc}") from exc
+
+
+def set_preprocess(preprocess):
+    """Executor initializer: install the CLIP preprocess transform in this worker."""
+    global _preprocess
+    _preprocess = preprocess
+
+
+def _to_rgb(image):
+    return image.convert("RGB")
+
+
+def clip_preprocess(n_px=224):
+    """The same transform ``clip.load`` returns, built without loading CLIP."""
+    from torchvision.transforms import CenterCrop, Compose, InterpolationMode, Normalize, Resize, ToTensor
+
+    return Compose([
+        Resize(n_px, interpolation=InterpolationMode.BICUBIC),
+        CenterCrop(n_px),
+        _to_rgb,
+        ToTensor(),
+        Normalize(CLIP_MEAN, CLIP_STD),
+    ])
+
+
+def open_image(data):
+    """Open ``data`` lazily; only the header is read, and images over RECYCLER_MAX_PIXELS are refused."""
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if width * height > config.MAX_PIXELS:
+        raise TooLarge(f"Image is {width}x{height}, over the {config.MAX_PIXELS} pixel limit")
+    return image
+
+
+def decode_image(data, draft_size=None):
+    """Decode to RGB; with ``draft_size`` JPEGs are DCT-scaled down to no less than that size."""
+    image = open_image(data)
+    if draft_size is not None:
+        image.draft("RGB", draft_size)
+    return image.convert("RGB")
+
+
+class FastPreprocess:
+    """Fast stand-in for CLIP's ``preprocess``.
+
+    Decoding is done near the target size (JPEG draft mode) and Resize(n_px) +
+    CenterCrop(n_px) collapse into a single PIL resample of the crop box. The
+    result is an unnormalized uint8 [3, n_px, n_px] tensor; ``normalize``
+    finishes a whole stacked batch in one tensor op.
+    """
+
+    def __init__(self, n_px=224, oversample=2):
+        self.n_px = n_px
+        # Keep some resolution above n_px so the bicubic filter still antialiases
+        self.draft_size = (n_px * oversample, n_px * oversample)
+
+    def __call__(self, image):
+        n = self.n_px
+        w, h = image.size
+        # Same output geometry as torchvision Resize(n) followed by CenterCrop(n)
+        if w <= h:
+            rw, rh = n, int(n * h / w)
+        else:
+            rw, rh = int(n * w / h), n
+        left = int(round((rw - n) / 2.0))
+        top = int(round((rh - n) / 2.0))
+        sx, sy = w / rw, h / rh
+        box = (left * sx, top * sy, (left + n) * sx, (top + n) * sy)
+        out = image.resize((n, n), Image.BICUBIC, box=box)
+        return torch.from_numpy(np.array(out)).permute(2, 0, 1).contiguous()
+
+
+_SCALE = torch.tensor([1.0 / (255.0 * s) for s in CLIP_STD]).view(1, 3, 1, 1)
+_SHIFT = torch.tensor([-m / s for m, s in zip(CLIP_MEAN, CLIP_STD)]).view(1, 3, 1, 1)
+
+
+def normalize(batch):
+    """uint8 [B, 3, H, W] -> CLIP-normalized float32, in one fused multiply-add."""
+    return torch.addcmul(_SHIFT.to(batch.device), batch.float(), _SCALE.to(batch.device))
+
+
+def preview_jpeg(image, max_size=256, quality=80):
+    """Bounded-size JPEG thumbnail. Shrinks ``image`` in place, so call it last."""
+    image.thumbnail((max_size, max_size), Image.BILINEAR, reducing_gap=2.0)
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+def dhash(image, size=8):
+    """64-bit difference hash of a downscaled grayscale copy (robust to re-encoding)."""
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    px = small.tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = px[row * (size + 1) + col]
+            right = px[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def prepare(data, tensor=True, preview=None, perceptual=False):
+    """Decode an upload once into (model input tensor, JPEG thumbnail, dHash, stage timings).
+
+    ``preview`` is a (max_size, quality) pair or None. Parts that weren't asked
+    for come back as None. Timings map stage name to seconds.
+    """
+    t0 = time.perf_counter()
+    image = _decoding(decode_image, data, getattr(_preprocess, "draft_size", None))
+    t1 = time.perf_counter()
+    timings = {"decode": t1 - t0}
+    x = dh = thumb = None
+    if tensor:
+        x = _preprocess(image)
+        t0, t1 = t1, time.perf_counter()
+        timings["preprocess"] = t1 - t0
+    if perceptual:
+        dh = dhash(image)
+        t0, t1 = t1, time.perf_counter()
+        timings["dhash"] = t1 - t0
+    if preview:
+        thumb = preview_jpeg(image, *preview)
+        timings["preview_encode"] = time.perf_counter() - t1
+    return x, thumb, dh, timings
+
+
+def frame_signature(data, size=32):
+    """size x size int16 grayscale copy of an image, decoded DCT-scaled for JPEGs."""
+    probe = open_image(data)
+    probe.draft("L", (size * 2, size * 2))
+    return np.asarray(probe.convert("L").resize((size, size), Image.BILINEAR), dtype=np.int16)
+
+
+def prepare_frame(data, previous=None, threshold=0.0, size=32):
+    """Decode a stream frame unless it matches ``previous``: (model input or None, signature, timings).
+
+    The signature is a size x size grayscale copy, decoded DCT-scaled for
+    JPEGs, so an unchanged frame costs a fraction of a full decode. A frame
+    counts as unchanged when the mean absolute difference to ``previous``
+    (0-255) is below ``threshold``.
+    """
+    t0 = time.perf_counter()
+    signature = _decoding(frame_signature, data, size)
+    t1 = time.perf_counter()
+    timings = {"frame_diff": t1 - t0}
+    if previous is not None and np.abs(signature - previous).mean() < threshold:
+        return None, signature, timings
+    image = _decoding(decode_image, data, getattr(_preprocess, "draft_size", None))
+    t0, t1 = t1, time.perf_counter()
+    timings["decode"] = t1 - t0
+    x = _preprocess(image)
+    timings["preprocess"] = time.perf_counter() - t1
+    return x, signature, timings
+
+
+def load_file(path):
+    """Read, decode and preprocess one image file with the installed transform."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return _preprocess(decode_image(data, getattr(_preprocess, "draft_size", None)))
+
+
+def list_images(folder):
+    """Image files under ``folder``, recursively, in a stable order."""
+    return [
+        os.path.join(root, name)
+        for root, dirs, names in sorted(os.walk(folder))
+        for name in sorted(names)
+        if name.lower().endswith(IMAGE_SUFFIXES)
+    ]
+
+
+def image_folder(folder):
+    """(path, label) pairs from an ImageFolder layout: folder/<label>/**/<image>."""
+    return [
+        (path, label)
+        for label in sorted(os.listdir(folder))
+        if os.path.isdir(os.path.join(folder, label))
+        for path in list_images(os.path.join(folder, label))
+    ]
+
+
+def is_archive(filename):
+    return (filename or "").lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _wanted(name):
+    base = os.path.basename(name)
+    return base and not base.startswith(".") and "__MACOSX" not in name
+
+
+def expand_archive(data, max_member=None, max_total=None, max_files=None):
+    """List the (member name, bytes) regular files of a zip or tar archive.
+
+    A member over ``max_member`` bytes, a total over ``max_total`` or more than
+    ``max_files`` images raises TooLarge. Declared sizes are checked before
+    any member data is decompressed or skipped (for tar, headers and skipped
+    members count too), and reads are capped as well, since a zip's declared
+    sizes can lie.
+    """
+    members = []
+    declared = total = 0
+
+    def check(name, size, running):
+        if max_member is not None and size > max_member:
+            raise TooLarge(f"Archive member {name} exceeds {max_member} bytes")
+        if max_total is not None and running > max_total:
+            raise TooLarge(f"Archive expands past {max_total} bytes")
+
+    def read(name, f):
+        nonlocal total
+        if max_files is not None and len(members) >= max_files:
+            raise TooLarge(f"Archive holds more than {max_files} images")
+        member = f.read(max_member + 1) if max_member is not None else f.read()
+        total += len(member)
+        check(name, len(member), total)
+        members.append((name, member))
+
+    buf = io.BytesIO(data)
+    if zipfile.is_zipfile(buf):
+        with zipfile.ZipFile(buf) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _wanted(info.filename):
+                    declared += info.file_size
+                    check(info.filename, info.file_size, declared)
+                    with zf.open(info) as f:
+                        read(info.filename, f)
+            return members
+    buf.seek(0)
+    # Streamed member by member: moving to the next header decompresses the data before it
+    with tarfile.open(fileobj=buf, mode="r|*") as tf:
+        for member in tf:
+            declared += tarfile.BLOCKSIZE + member.size
+            check(member.name, member.size if member.isfile() else 0, declared)
+            if member.isfile() and _wanted(member.name):
+                read(member.name, tf.extractfile(member))
+    return members
+
+
+def _parity(argv=None):
+    """Compare FastPreprocess against CLIP's preprocess on a folder of images."""
+    from clip.clip import _transform
+
+    parser = argparse.ArgumentParser(description=_parity.__doc__)
+    parser.add_argument("folder")
+    parser.add_argument("--n-px", type=int, default=224)
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="max allowed mean |fast - reference| in normalized units")
+    args = parser.parse_args(argv)
+
+    reference, fast = _transform(args.n_px), FastPreprocess(args.n_px)
+    worst_mean = worst_max = 0.0
+    count = 0
+    for path in list_images(args.folder):
+        with open(path, "rb") as f:
+            data = f.read()
+        ref = reference(decode_image(data))
+        out = normalize(fast(decode_image(data, fast.draft_size)).unsqueeze(0))[0]
+        diff = (out - ref).abs()
+        worst_mean = max(worst_mean, diff.mean().item())
+        worst_max = max(worst_max, diff.max().item())
+        count += 1
+    print(f"{count} images: worst mean abs diff {worst_mean:.4f}, worst max abs diff {worst_max:.4f}")
+    return 0 if count and worst_mean <= args.tolerance else 1
+
+
+if __name__ == "__main__":
+    sys.exit(_parity())
@@ -0,0 +1,381 @@
+# knn.py
+"""k-nearest-neighbour index over labeled CLIP image features.
+
+    python knn.py build features/train knn/train                 # exact (flat)
+    python knn.py build train_emb.pt knn/train --clip-name ViT-B/32 --ivfpq --nlist 1024 --m 64
+    python knn.py add knn/train features/new
+    python knn.py info knn/train
+
+Features are L2-normalized, so similarity is the inner product. An index
+directory holds:
+
+    meta.json    model, dim, classes, kind ("flat" or "ivfpq") and its parameters
+    ids.txt      one id per line (image path or <file>#<row>); line n owns row n
+    labels.i32   class index per row (-1: unlabeled)
+    vectors.f32  flat: the features, searched exactly with a blocked matmul + top-k
+    coarse.npy, codebooks.npy, lists.i32, codes.u8
+                 ivfpq: k-means coarse centroids, product-quantized residuals
+                 (m bytes per row) and each row's list; a query scans only its
+                 ``nprobe`` closest lists, with per-query lookup tables
+
+Row files are raw arrays read through memory maps. Adds append to them and
+write the ids line last, so a crash never indexes a partial row. Readers
+(the server) only map the rows every file already holds and never write;
+``add`` takes a lock file and cuts off what an interrupted add left behind.
+"""
+import argparse, fcntl, json, os, sys, time
+from contextlib import contextmanager
+import numpy as np
+
+FORMAT = "recycler-knn"
+FORMAT_VERSION = 1
+BLOCK_ROWS = 65536
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def _topk(scores, rows, k):
+    """The k best (score, row) per query row, best first."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores, rows = np.take_along_axis(scores, part, 1), np.take_along_axis(rows, part, 1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(scores, order, 1), np.take_along_axis(rows, order, 1)
+
+
+def _assign(x, centroids):
+    """Nearest centroid (L2) per row, computed in blocks."""
+    c_sq = (centroids * centroids).sum(1)
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), BLOCK_ROWS):
+        block = x[start:start + BLOCK_ROWS]
+        out[start:start + len(block)] = (c_sq - 2 * block @ centroids.T).argmin(1)
+    return out
+
+
+def kmeans(x, k, iters=20, seed=0):
+    """Lloyd's k-means; empty clusters are reseeded from random rows."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(x[order], starts, axis=0) / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+class KNNIndex:
+    def __init__(self, root):
+        self.root = root
+        self._load()
+        if self.kind == "ivfpq":
+            self.coarse = np.load(self._path("coarse.npy"))
+            self.codebooks = np.load(self._path("codebooks.npy"))
+        self._map()
+
+    def _load(self):
+        with open(self._path("meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT or self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{self.root} is not a {FORMAT} v{FORMAT_VERSION} index")
+        self.dim, self.model, self.kind = self.meta["dim"], self.meta["model"], self.meta["kind"]
+        self.classes = self.meta["classes"]
+        with open(self._path("ids.txt"), encoding="utf-8") as f:
+            # A line still being written has no newline yet and isn't part of the index
+            self.ids = [line[:-1] for line in f if line.endswith("\n")]
+
+    @classmethod
+    def create(cls, root, dim, model, classes=(), kind="flat", train=None, nlist=256, m=32, seed=0):
+        """An empty index; ``ivfpq`` learns its quantizers from the ``train`` sample."""
+        if os.path.exists(os.path.join(root, "meta.json")):
+            raise ValueError(f"{root} already holds an index")
+        os.makedirs(root, exist_ok=True)
+        meta = {"format": FORMAT, "format_version": FORMAT_VERSION, "model": model, "dim": int(dim),
+                "classes": list(classes), "kind": kind}
+        if kind == "ivfpq":
+            if dim % m:
+                raise ValueError(f"--m must divide the feature size {dim}")
+            train = _normalize(train)
+            coarse = kmeans(train, nlist, seed=seed)
+            residuals = (train - coarse[_assign(train, coarse)]).reshape(len(train), m, dim // m)
+            codebooks = np.stack([kmeans(residuals[:, j], 256, seed=seed + j) for j in range(m)])
+            np.save(os.path.join(root, "coarse.npy"), coarse)
+            np.save(os.path.join(root, "codebooks.npy"), codebooks)
+            meta.update(nlist=len(coarse), m=m)
+        elif kind != "flat":
+            raise ValueError(f"Unknown index kind {kind!r}")
+        for name in cls._row_files(kind):
+            open(os.path.join(root, name), "wb").close()
+        open(os.path.join(root, "ids.txt"), "w").close()
+        with open(os.path.join(root, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return cls(root)
+
+    @staticmethod
+    def _row_files(kind):
+        return ("labels.i32", "vectors.f32") if kind == "flat" else ("labels.i32", "lists.i32", "codes.u8")
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _layout(self):
+        """{row file: (dtype, per-row shape, bytes per row)}"""
+        shapes = {"labels.i32": (np.int32, ()), "lists.i32": (np.int32, ()),
+                  "vectors.f32": (np.float32, (self.dim,)), "codes.u8": (np.uint8, (self.meta.get("m", 0),))}
+        layout = {}
+        for name in self._row_files(self.kind):
+            dtype, tail = shapes[name]
+            layout[name] = dtype, tail, np.dtype(dtype).itemsize * int(np.prod(tail, dtype=np.int64))
+        return layout
+
+    def _map(self):
+        """Memory-map the rows that are indexed and present in every row file; nothing is written."""
+        layout = self._layout()
+        n = min([len(self.ids)] + [os.path.getsize(self._path(name)) // size for name, (_, _, size) in layout.items()])
+        del self.ids[n:]
+        self._rows = {}
+        for name, (dtype, tail, _) in layout.items():
+            self._rows[name] = np.memmap(self._path(name), dtype=dtype, mode="r", shape=(n, *tail)) if n else \
+                np.empty((0, *tail), dtype=dtype)
+        self.labels = self._rows["labels.i32"]
+        self._lists = None  # ivfpq inverted lists, built on first search
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive writer lock; inside it the index is current and an interrupted add is cut off."""
+        with open(self._path("write.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._load()
+                with open(self._path("ids.txt"), "rb+") as f:
+                    f.truncate(f.read().rfind(b"\n") + 1)
+                for name, (_, _, size) in self._layout().items():
+                    if os.path.getsize(self._path(name)) < len(self.ids) * size:
+                        raise ValueError(f"{self._path(name)} is missing rows listed in ids.txt")
+                    os.truncate(self._path(name), len(self.ids) * size)
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _encode(self, x):
+        """(list, PQ codes) per row for the ivfpq layout."""
+        lists = _assign(x, self.coarse)
+        m, _, sub = self.codebooks.shape
+        residuals = (x - self.coarse[lists]).reshape(len(x), m, sub)
+        codes = np.stack([_assign(residuals[:, j], self.codebooks[j]) for j in range(m)], axis=1)
+        return lists.astype(np.int32), codes.astype(np.uint8)
+
+    def add(self, vectors, labels=None, ids=None):
+        """Append features with optional class names and ids; returns the new row count."""
+        x = _normalize(vectors)
+        if len(x) == 0:
+            return len(self)
+        labels = [None] * len(x) if labels is None else labels
+        with self._writing():
+            ids = list(ids) if ids is not None else [str(i) for i in range(len(self), len(self) + len(x))]
+            if any("\n" in i for i in ids):
+                raise ValueError("ids can't contain newlines")
+            if any(name is not None and name not in self.classes for name in labels):
+                self.classes.extend(sorted({n for n in labels if n is not None} - set(self.classes)))
+                with open(self._path("meta.json.tmp"), "w", encoding="utf-8") as f:
+                    json.dump(self.meta, f, ensure_ascii=False)
+                os.replace(self._path("meta.json.tmp"), self._path("meta.json"))
+            index = {name: i for i, name in enumerate(self.classes)}
+            columns = {"labels.i32": np.array([index.get(n, -1) for n in labels], dtype=np.int32)}
+            if self.kind == "flat":
+                columns["vectors.f32"] = x
+            else:
+                columns["lists.i32"], columns["codes.u8"] = self._encode(x)
+            for name, rows in columns.items():
+                with open(self._path(name), "ab") as f:
+                    f.write(np.ascontiguousarray(rows).tobytes())
+            # The ids line goes last: it is what makes the rows part of the index
+            with open(self._path("ids.txt"), "a", encoding="utf-8") as f:
+                f.writelines(i + "\n" for i in ids)
+            self.ids.extend(ids)
+            self._map()
+        return len(self)
+
+    def search(self, queries, k=5, nprobe=8):
+        """(similarities [n, k], rows [n, k]) best first; rows are -1 where fewer than k exist."""
+        q = _normalize(np.atleast_2d(queries))
+        if self.kind == "flat":
+            scores, rows = self._search_flat(q, k)
+        else:
+            scores, rows = self._search_ivfpq(q, k, nprobe)
+        if scores.shape[1] < k:
+            pad = k - scores.shape[1]
+            scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+            rows = np.pad(rows, ((0, 0), (0, pad)), constant_values=-1)
+        return scores, rows
+
+    def _search_flat(self, q, k):
+        vectors = self._rows["vectors.f32"]
+        best_s = np.empty((len(q), 0), dtype=np.float32)
+        best_r = np.empty((len(q), 0), dtype=np.int64)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = q @ vectors[start:start + BLOCK_ROWS].T
+            rows = np.broadcast_to(np.arange(start, start + block.shape[1]), block.shape)
+            best_s, best_r = _topk(np.concatenate([best_s, block], 1), np.concatenate([best_r, rows], 1), k)
+        return best_s, best_r
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            lists = self._rows["lists.i32"]
+            order = np.argsort(lists, kind="stable")
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(self.coarse)))])
+            self._lists = order, bounds
+        return self._lists
+
+    def _search_ivfpq(self, q, k, nprobe):
+        order, bounds = self._inverted_lists()
+        codes = self._rows["codes.u8"]
+        m, _, sub = self.codebooks.shape
+        coarse_scores = q @ self.coarse.T
+        probes = np.argsort(-coarse_scores, axis=1)[:, :nprobe]
+        out_s = np.full((len(q), k), -np.inf, dtype=np.float32)
+        out_r = np.full((len(q), k), -1, dtype=np.int64)
+        for n, (qv, lists) in enumerate(zip(q, probes)):
+            rows = np.concatenate([order[bounds[l]:bounds[l + 1]] for l in lists])
+            if not len(rows):
+                continue
+            # q . (centroid + residual) = q . centroid + sum over subspaces of q_j . codeword_j
+            table = np.einsum("jcd,jd->jc", self.codebooks, qv.reshape(m, sub))
+            scores = table[np.arange(m), codes[rows]].sum(1)
+            scores += coarse_scores[n, self._rows["lists.i32"][rows]]
+            s, r = _topk(scores[None], rows[None], k)
+            out_s[n, :s.shape[1]], out_r[n, :r.shape[1]] = s[0], r[0]
+        return out_s, out_r
+
+    def lookup(self, feature, k=5, nprobe=8):
+        """Neighbours of one feature and their similarity-weighted class vote (None when unlabeled)."""
+        scores, rows = self.search(feature, k, nprobe)
+        neighbors, weights = [], {}
+        for s, r in zip(scores[0], rows[0]):
+            if r < 0:
+                break
+            label = int(self.labels[r])
+            name = self.classes[label] if label >= 0 else None
+            neighbors.append({"id": self.ids[r], "class": name, "similarity": round(float(s), 6)})
+            if name is not None:
+                weights[name] = weights.get(name, 0.0) + max(float(s), 0.0)
+        total = sum(weights.values())
+        if not total:
+            return neighbors, None
+        best = max(weights, key=weights.get)
+        return neighbors, {"class": best, "share": round(weights[best] / total, 6)}
+
+    def stats(self):
+        return {"rows": len(self), "kind": self.kind, "dim": self.dim, "classes": len(self.classes)}
+
+
+def _batches(path, batch_size=65536, shuffle=False, clip_name=None):
+    """(model, dim, batches of (features, class names, ids)) from a features.py directory or .pt file.
+
+    ``clip_name`` names the model of a source that doesn't record it (the notebook's train_emb.pt).
+    """
+    if os.path.isdir(path):
+        import features
+
+        reader = features.FeatureShards(path)
+
+        def gen():
+            for X, y, paths in reader.iter_batches(batch_size, shuffle=shuffle):
+                yield X.numpy(), [reader.classes[i] if i >= 0 else None for i in y.tolist()], paths
+        return _model(path, reader.model, clip_name), reader.dim, gen()
+    import train
+
+    X, y, classes, model = train.load_features(path)
+    model = _model(path, model, clip_name)
+    names = [classes[i] if i >= 0 else None for i in y.tolist()]
+    base = os.path.basename(path)
+    return model, X.shape[1], iter([(X.numpy(), names, [f"{base}#{i}" for i in range(len(X))])])
+
+
+def _model(path, recorded, clip_name):
+    if recorded and clip_name and recorded != clip_name:
+        raise ValueError(f"{path} holds {recorded} features, not {clip_name}")
+    return recorded or clip_name
+
+
+def _add_from(index, path, clip_name=None, log=print):
+    model, dim, batches = _batches(path, clip_name=clip_name)
+    if (model, dim) != (index.model, index.dim):
+        raise ValueError(f"{path} holds {model} {dim}-d features, the index {index.model} {index.dim}-d")
+    known, added = set(index.ids), 0
+    for X, names, ids in batches:
+        keep = [i for i, id_ in enumerate(ids) if id_ not in known]
+        index.add(X[keep], [names[i] for i in keep], [ids[i] for i in keep])
+        added += len(keep)
+    log(f"added {added} rows, {len(index)} in the index")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="k-nearest-neighbour index over labeled CLIP features")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="create an index from a features directory or .pt file")
+    b.add_argument("source")
+    b.add_argument("out_dir")
+    b.add_argument("--ivfpq", action="store_true", help="inverted lists + product quantization")
+    b.add_argument("--nlist", type=int, default=256, help="ivfpq coarse lists")
+    b.add_argument("--m", type=int, default=32, help="ivfpq bytes per vector (must divide the dim)")
+    b.add_argument("--train-sample", type=int, default=100000, help="rows the ivfpq quantizers learn from")
+    b.add_argument("--seed", type=int, default=0)
+    a = sub.add_parser("add", help="append rows the index doesn't have yet")
+    a.add_argument("index_dir")
+    a.add_argument("source")
+    for p in (b, a):
+        p.add_argument("--clip-name", help="CLIP model the features came from (default: from the source)")
+    i = sub.add_parser("info", help="summarize an index and time a few queries")
+    i.add_argument("index_dir")
+    i.add_argument("--k", type=int, default=5)
+    i.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        # The first shuffled batch doubles as the ivfpq training sample
+        model, dim, batches = _batches(args.source, batch_size=args.train_sample, shuffle=True,
+                                       clip_name=args.clip_name)
+        if not model:
+            # The server only opens an index built from its own CLIP model
+            parser.error(f"{args.source} doesn't record its CLIP model; pass --clip-name (e.g. ViT-B/32)")
+        first = next(batches, None)
+        train = None
+        if args.ivfpq and first is not None:
+            rng = np.random.default_rng(args.seed)
+            train = first[0][rng.permutation(len(first[0]))[:args.train_sample]]
+        index = KNNIndex.create(args.out_dir, dim, model, kind="ivfpq" if args.ivfpq else "flat",
+                                train=train, nlist=args.nlist, m=args.m, seed=args.seed)
+        _add_from(index, args.source, args.clip_name)
+    elif args.command == "add":
+        _add_from(KNNIndex(args.index_dir), args.source, args.clip_name)
+    else:
+        index = KNNIndex(args.index_dir)
+        print(f"{len(index)} rows ({index.kind}, {index.model}, dim {index.dim}), {len(index.classes)} classes")
+        if len(index):
+            rows = np.random.default_rng(0).choice(len(index), min(len(index), 100), replace=False)
+            if index.kind == "flat":
+                queries = np.asarray(index._rows["vectors.f32"][np.sort(rows)])
+            else:
+                queries = np.random.default_rng(0).standard_normal((len(rows), index.dim))
+            started = time.perf_counter()
+            for q in queries:
+                index.lookup(q, args.k, args.nprobe)
+            print(f"lookup (k={args.k}): {(time.perf_counter() - started) / len(queries) * 1e3:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# metrics.py
+"""Per-stage latency histograms and counters, rendered in the Prometheus text format.
+
+Dependency-free and cheap enough to leave on: an observation is a bisect
+into fixed buckets plus a few increments under a lock.
+"""
+import threading, time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond cache hits up to multi-second batch uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram, one series per label value."""
+
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for value, series in sorted(snapshot.items()):
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                running += count
+                le = bound if bound == "+Inf" else _num(bound)
+                lines.append(f"{self.name}_bucket{_labels([(self.label, value), ('le', le)])} {running}")
+            lines.append(f"{self.name}_sum{_labels([(self.label, value)])} {_num(series[-1])}")
+            lines.append(f"{self.name}_count{_labels([(self.label, value)])} {running}")
+        return lines
+
+
+class Metrics:
+    """Registry the server records into; a disabled registry drops every observation."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = Histogram(
+            "recycler_stage_seconds", "Time spent in each prediction pipeline stage", "stage"
+        )
+        self.requests = Histogram(
+            "recycler_request_seconds", "End-to-end prediction latency per endpoint", "endpoint"
+        )
+        self.batches = Histogram(
+            "recycler_batch_size", "Images per forward pass", "engine", BATCH_SIZE_BUCKETS
+        )
+        self.predicted = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self.stages.observe(stage, seconds)
+
+    def observe_many(self, timings):
+        if self.enabled:
+            for stage, seconds in timings.items():
+                self.stages.observe(stage, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.observe(name, time.perf_counter() - t0)
+
+    @contextmanager
+    def request(self, endpoint):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.requests.observe(endpoint, time.perf_counter() - t0)
+
+    def batch(self, engine, size):
+        if self.enabled:
+            self.batches.observe(engine, size)
+
+    def count_class(self, name):
+        if self.enabled:
+            with self._lock:
+                self.predicted[name] += 1
+
+    def render(self, extra=()):
+        """Prometheus text exposition; ``extra`` adds (name, type, help, value) samples read at scrape time."""
+        lines = []
+        for histogram in (self.stages, self.requests, self.batches):
+            lines.extend(histogram.render())
+        lines += ["# HELP recycler_predictions_total Predictions served per class",
+                  "# TYPE recycler_predictions_total counter"]
+        with self._lock:
+            predicted = sorted(self.predicted.items())
+        for name, count in predicted:
+            lines.append(f"recycler_predictions_total{_labels([('class', name)])} {count}")
+        for name, kind, help, value in extra:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_num(value)}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,659 @@
+# pages.py
+"""HTML pages, rendered once at startup.
+
+Static pages become pre-compressed byte bodies served with ETag/Cache-Control.
+The result page is pre-rendered per class_info key with slots left for the
+few per-request values, so a response is a handful of byte concatenations.
+"""
+import gzip, hashlib
+from fastapi import Request, Response
+
+LANDING_HTML = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Recyclable Trash Predictor - AI Powered Classification</title>
+        <style>
+            * {
+                margin: 0;
+                padding: 0;
+                box-sizing: border-box;
+            }
+            
+            body {
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                min-height: 100vh;
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                padding: 20px;
+            }
+            
+            .container {
+                max-width: 1200px;
+                width: 100%;
+                background: white;
+                border-radius: 30px;
+                box-shadow: 0 20px 60px rgba(0, 0, 0, 0.3);
+                overflow: hidden;
+                display: flex;
+                flex-direction: row;
+                align-items: center;
+            }
+            
+            .left-section {
+                flex: 1;
+                padding: 60px;
+                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                color: white;
+            }
+            
+            .right-section {
+                flex: 1;
+                padding: 60px;
+                background: white;
+            }
+            
+            h1 {
+                font-size: 3em;
+                margin-bottom: 20px;
+                font-weight: 800;
+            }
+            
+            .tagline {
+                font-size: 1.3em;
+                margin-bottom: 30px;
+                opacity: 0.95;
+                line-height: 1.6;
+            }
+            
+            .features {
+                margin: 40px 0;
+            }
+            
+            .feature {
+                display: flex;
+                align-items: center;
+                margin: 20px 0;
+                font-size: 1.1em;
+            }
+            
+            .feature-icon {
+                font-size: 2em;
+                margin-right: 15px;
+            }
+            
+            .cta-button {
+                display: inline-block;
+                background: white;
+                color: #667eea;
+                padding: 18px 50px;
+                border-radius: 50px;
+                font-size: 1.2em;
+                font-weight: bold;
+                text-decoration: none;
+                transition: all 0.3s ease;
+                box-shadow: 0 10px 30px rgba(0, 0, 0, 0.2);
+            }
+            
+            .cta-button:hover {
+                transform: translateY(-3px);
+                box-shadow: 0 15px 40px rgba(0, 0, 0, 0.3);
+            }
+            
+            .cta-button:active {
+                transform: translateY(-1px);
+            }
+            
+            .demo-preview {
+                text-align: center;
+            }
+            
+            .demo-box {
+                background: linear-gradient(135deg, #f5f7fa 0%, #e1e8ed 100%);
+                padding: 30px;
+                border-radius: 20px;
+                margin: 20px 0;
+            }
+            
+            .demo-step {
+                background: white;
+                padding: 20px;
+                margin: 15px 0;
+                border-radius: 15px;
+                border-left: 5px solid #667eea;
+                box-shadow: 0 5px 15px rgba(0, 0, 0, 0.1);
+            }
+            
+            .demo-step h3 {
+                color: #667eea;
+                margin-bottom: 10px;
+                font-size: 1.3em;
+            }
+            
+            .demo-step p {
+                color: #666;
+                line-height: 1.6;
+            }
+            
+            .badge {
+                display: inline-block;
+                background: rgba(255, 255, 255, 0.2);
+                padding: 8px 20px;
+                border-radius: 50px;
+                font-size: 0.9em;
+                margin-bottom: 20px;
+            }
+            
+            @media (max-width: 768px) {
+                .container {
+                    flex-direction: column;
+                }
+                
+                .left-section,
+                .right-section {
+                    padding: 40px;
+                }
+                
+                h1 {
+                    font-size: 2em;
+                }
+            }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="left-section">
+                <div class="badge">🔄 AI-Powered Recycling Assistant</div>
+                <h1>Smart Trash Classification</h1>
+                <p class="tagline">
+                    Upload any image and let our AI determine if it's recyclable or not. 
+                    Help make the world a greener place, one prediction at a time!
+                </p>
+                
+                <div class="features">
+                    <div class="feature">
+                        <span class="feature-icon">🎯</span>
+                        <span>Instant Classification</span>
+                    </div>
+                    <div class="feature">
+                        <span class="feature-icon">🤖</span>
+                        <span>AI-Powered Detection</span>
+                    </div>
+                    <div class="feature">
+                        <span class="feature-icon">⚡</span>
+                        <span>Lightning Fast</span>
+                    </div>
+                    <div class="feature">
+                        <span class="feature-icon">🆓</span>
+                        <span>100% Free</span>
+                    </div>
+                </div>
+                
+                <a href="/predict" class="cta-button">🚀 Try It Now</a>
+            </div>
+            
+            <div class="right-section">
+                <div class="demo-preview">
+                    <h2 style="color: #333; margin-bottom: 20px;">How It Works</h2>
+                    
+                    <div class="demo-box">
+                        <div class="demo-step">
+                            <h3>1️⃣ Upload Your Image</h3>
+                            <p>Simply select any image from your device using our intuitive file uploader.</p>
+                        </div>
+                        
+                        <div class="demo-step">
+                            <h3>2️⃣ AI Processing</h3>
+                            <p>Our advanced machine learning model analyzes your image in seconds.</p>
+                        </div>
+                        
+                        <div class="demo-step">
+                            <h3>3️⃣ Get Results</h3>
+                            <p>Receive instant feedback on whether your item is recyclable or not.</p>
+                        </div>
+                    </div>
+                    
+                    <p style="color: #999; font-size: 0.9em; margin-top: 30px;">
+                        Powered by CLIP and Custom ML Architecture
+                    </p>
+                </div>
+            </div>
+        </div>
+        
+        <script>
+            // Add some subtle animations
+            document.querySelector('.container').style.opacity = '0';
+            document.querySelector('.container').style.transform = 'translateY(20px)';
+            document.querySelector('.container').style.transition = 'all 0.8s ease';
+            
+            setTimeout(() => {
+                document.querySelector('.container').style.opacity = '1';
+                document.querySelector('.container').style.transform = 'translateY(0)';
+            }, 100);
+        </script>
+    </body>
+    </html>
+    """
+
+FORM_HTML = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Recyclable Trash Predictor</title>
+        <style>
+            body {
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                display: flex;
+                justify-content: center;
+                align-items: center;
+                min-height: 100vh;
+                margin: 0;
+            }
+            .container {
+                background: white;
+                padding: 40px;
+                border-radius: 20px;
+                box-shadow: 0 20px 60px rgba(0, 0, 0, 0.3);
+                max-width: 500px;
+                width: 100%;
+            }
+            h1 {
+                color: #333;
+                margin-bottom: 10px;
+                text-align: center;
+            }
+            .subtitle {
+                color: #666;
+                text-align: center;
+                margin-bottom: 30px;
+                font-size: 14px;
+            }
+            .upload-box {
+                border: 3px dashed #667eea;
+                border-radius: 10px;
+                padding: 30px;
+                text-align: center;
+                background: #f8f9fa;
+                transition: all 0.3s ease;
+            }
+            .upload-box:hover {
+                background: #f0f2ff;
+                border-color: #764ba2;
+            }
+            input[type="file"] {
+                margin: 10px 0;
+                padding: 10px;
+                width: 100%;
+                border: 1px solid #ddd;
+                border-radius: 5px;
+            }
+            button {
+                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                color: white;
+                padding: 15px 40px;
+                border: none;
+                border-radius: 25px;
+                font-size: 16px;
+                font-weight: bold;
+                cursor: pointer;
+                width: 100%;
+                transition: transform 0.2s ease;
+            }
+            button:hover {
+                transform: translateY(-2px);
+            }
+            button:active {
+                transform: translateY(0);
+            }
+            .preview {
+                margin: 20px 0;
+                text-align: center;
+            }
+            .preview img {
+                max-width: 200px;
+                max-height: 200px;
+                border-radius: 10px;
+                box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2);
+            }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h1>🔄 Recyclable Trash Predictor</h1>
+            <p class="subtitle">Upload an image to classify it as recyclable or not</p>
+            
+            <form id="uploadForm" enctype="multipart/form-data">
+                <div class="upload-box">
+                    <p>📸 Select an image file</p>
+                    <input type="file" name="file" accept="image/*" id="fileInput" required>
+                </div>
+                <div class="preview" id="preview"></div>
+                <button type="submit">🔍 Predict</button>
+            </form>
+        </div>
+
+        <script>
+            const fileInput = document.getElementById('fileInput');
+            const preview = document.getElementById('preview');
+            const form = document.getElementById('uploadForm');
+
+            fileInput.addEventListener('change', function(e) {
+                const file = e.target.files[0];
+                if (file) {
+                    const reader = new FileReader();
+                    reader.onload = function(event) {
+                        preview.innerHTML = '<img src="' + event.target.result + '" alt="Preview">';
+                    }
+                    reader.readAsDataURL(file);
+                }
+            });
+
+            form.addEventListener('submit', async function(e) {
+                e.preventDefault();
+                const formData = new FormData(form);
+                
+                try {
+                    const response = await fetch('/predict', {
+                        method: 'POST',
+                        body: formData
+                    });
+                    
+                    if (response.ok) {
+                        const data = await response.text();
+                        document.body.innerHTML = data;
+                    } else {
+                        alert('Error: ' + response.statusText);
+                    }
+                } catch (error) {
+                    alert('Error: ' + error.message);
+                }
+            });
+        </script>
+    </body>
+    </html>
+    """
+
+ERROR_HTML = """
+            <html>
+            <head><title>Error</title></head>
+            <body style="font-family: sans-serif; text-align: center; padding: 50px;">
+                <h1>❌ Error</h1>
+                <p>Invalid image file</p>
+                <a href="/predict">Try again</a>
+            </body>
+            </html>
+            """
+
+
+class StaticPage:
+    """Pre-encoded page with a strong ETag and a gzip variant."""
+
+    def __init__(self, html, status_code=200, max_age=3600):
+        self.body = html.encode()
+        self.gzipped = gzip.compress(self.body, compresslevel=9)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.status_code = status_code
+        self.headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={max_age}",
+            "Vary": "Accept-Encoding",
+        }
+
+    def response(self, request: Request):
+        if self.status_code == 200 and self.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=self.headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            return Response(
+                content=self.gzipped,
+                status_code=self.status_code,
+                media_type="text/html; charset=utf-8",
+                headers={**self.headers, "Content-Encoding": "gzip"},
+            )
+        return Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type="text/html; charset=utf-8",
+            headers=self.headers,
+        )
+
+
+def result_html(class_info, matched_key, predicted_class, specific_type, preview_src):
+    """Full result page for one prediction"""
+    info = class_info[matched_key]
+    emission_saved = info['co2']
+    background_gradient = info['gradient']
+    result_color = info['color']
+    result_icon = info['icon']
+    
+    # Create bulb indicators HTML
+    bulb_html = ""
+    for key, other in class_info.items():
+        is_active = (key == matched_key)
+        bulb_class = "bulb bulb-active" if is_active else "bulb bulb-inactive"
+        bulb_html += f'''
+            <div class="{bulb_class}" style="background: {other['color'] if is_active else '#444444'}">
+                <div class="bulb-icon">{other['icon']}</div>
+                <div class="bulb-label">{other['category']}</div>
+            </div>
+        '''
+    
+    result_message = "Great job! This item is recyclable." if matched_key != 'trash' else "Needs proper disposal"
+    
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Prediction Result</title>
+        <style>
+            body {{
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                background: {background_gradient};
+                display: flex;
+                justify-content: center;
+                align-items: center;
+                min-height: 100vh;
+                margin: 0;
+                transition: background 0.5s ease;
+            }}
+            .result-container {{
+                background: white;
+                padding: 40px;
+                border-radius: 20px;
+                box-shadow: 0 20px 60px rgba(0, 0, 0, 0.3);
+                max-width: 500px;
+                width: 100%;
+                text-align: center;
+            }}
+            h1 {{
+                color: #333;
+                margin-bottom: 30px;
+            }}
+            .image-preview {{
+                margin: 20px 0;
+            }}
+            .image-preview img {{
+                max-width: 250px;
+                max-height: 250px;
+                border-radius: 10px;
+                box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2);
+            }}
+            .result-box {{
+                background: {background_gradient};
+                color: white;
+                padding: 20px;
+                border-radius: 10px;
+                margin: 20px 0;
+            }}
+            .result-box h2 {{
+                margin: 0;
+                font-size: 28px;
+            }}
+            .co2-box {{
+                background: {result_color};
+                color: white;
+                padding: 25px;
+                border-radius: 15px;
+                margin: 20px 0;
+                box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2);
+            }}
+            .co2-box h3 {{
+                margin: 0 0 10px 0;
+                font-size: 24px;
+            }}
+            .co2-box .big-number {{
+                font-size: 42px;
+                font-weight: bold;
+                margin: 10px 0;
+            }}
+            .co2-box .unit {{
+                font-size: 16px;
+                opacity: 0.9;
+            }}
+            .message-box {{
+                background: {result_color};
+                color: white;
+                padding: 15px;
+                border-radius: 10px;
+                margin: 15px 0;
+                font-size: 18px;
+                font-weight: bold;
+            }}
+            .bulb-container {{
+                display: flex;
+                flex-wrap: wrap;
+                justify-content: center;
+                gap: 10px;
+                margin: 20px 0;
+            }}
+            .bulb {{
+                width: 60px;
+                height: 60px;
+                border-radius: 50%;
+                display: flex;
+                flex-direction: column;
+                align-items: center;
+                justify-content: center;
+                transition: all 0.3s ease;
+                border: 3px solid transparent;
+                opacity: 0.5;
+            }}
+            .bulb-active {{
+                opacity: 1;
+                border-color: white;
+                transform: scale(1.2);
+                box-shadow: 0 0 20px rgba(255, 255, 255, 0.8);
+            }}
+            .bulb-inactive {{
+                opacity: 0.3;
+            }}
+            .bulb-icon {{
+                font-size: 24px;
+                margin-bottom: 2px;
+            }}
+            .bulb-label {{
+                font-size: 8px;
+                color: white;
+                text-align: center;
+                font-weight: bold;
+            }}
+            .specific-type {{
+                background: rgba(255, 255, 255, 0.2);
+                padding: 10px 20px;
+                border-radius: 20px;
+                margin: 10px 0;
+                font-size: 16px;
+                font-weight: bold;
+            }}
+            .back-button {{
+                background: {result_color};
+                color: white;
+                padding: 15px 40px;
+                border: none;
+                border-radius: 25px;
+                font-size: 16px;
+                font-weight: bold;
+                cursor: pointer;
+                text-decoration: none;
+                display: inline-block;
+                margin-top: 20px;
+                transition: all 0.3s ease;
+            }}
+            .back-button:hover {{
+                transform: translateY(-2px);
+                box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2);
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="result-container">
+            <h1>🎯 Prediction Result</h1>
+            
+            <div class="bulb-container">
+                {bulb_html}
+            </div>
+            
+            <div class="image-preview">
+                <img src="{preview_src}" alt="Uploaded image">
+            </div>
+            
+            <div class="result-box">
+                <h2>{result_icon} {predicted_class}</h2>
+                <div class="specific-type" style="background: {result_color}; margin-top: 10px;">
+                    📋 Specific Type: {specific_type}
+                </div>
+            </div>
+            
+            <div class="message-box">
+                {result_message}
+            </div>
+            
+            <div class="co2-box">
+                <h3>🌍 Environmental Impact</h3>
+                <div class="big-number">{emission_saved:.2f}</div>
+                <div class="unit">kg CO₂ emissions reduced</div>
+                <p style="margin: 15px 0 0 0; font-size: 14px; opacity: 0.95;">
+                    {'Recycling this item helps reduce greenhouse gas emissions and supports a circular economy!' if matched_key != 'trash' else 'Proper disposal still helps minimize environmental impact.'}
+                </p>
+            </div>
+            
+            <a href="/predict" class="back-button">🔄 Predict Another</a>
+        </div>
+    </body>
+    </html>
+    """
+
+
+# Per-request values are spliced into the pre-rendered pages at these markers
+_SLOTS = ("predicted_class", "specific_type", "preview_src")
+
+
+class ResultPages:
+    """Result page split into byte fragments per class_info key."""
+
+    def __init__(self, class_info):
+        markers = {name: f"\x00{name}\x00" for name in _SLOTS}
+        self._fragments = {}
+        for key in class_info:
+            html = result_html(class_info, key, **markers)
+            fragments, order = [], []
+            while True:
+                positions = [(html.find(m), name) for name, m in markers.items() if m in html]
+                if not positions:
+                    break
+                pos, name = min(positions)
+                fragments.append(html[:pos].encode())
+                order.append(name)
+                html = html[pos + len(markers[name]):]
+            fragments.append(html.encode())
+            self._fragments[key] = (fragments, order)
+
+    def render(self, matched_key, **values):
+        fragments, order = self._fragments[matched_key]
+        out = [fragments[0]]
+        for name, fragment in zip(order, fragments[1:]):
+            out.append(values[name].encode())
+            out.append(fragment)
+        return b"".join(out)
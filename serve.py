@@ -0,0 +1,89 @@
+# serve.py
+"""Multi-worker launcher with weights shared across processes.
+
+Uvicorn workers each run ``lifespan`` and would normally hold a private
+copy of CLIP. Here the model is converted once into a bundle before the
+workers start; every worker then memory-maps the same ``weights.pt``, so the
+OS page cache holds one physical copy however many workers there are. Each
+worker also learns the worker count (RECYCLER_WORKERS) and sizes its torch,
+ONNX Runtime and decode pools to its share of the cores.
+
+A bundle converted here follows its checkpoint: when recycler_mlp.pth is
+replaced, this process rewrites the bundle's head, and the workers, which
+watch the bundle, hot-reload it. A single worker serves the checkpoint as is.
+
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+"""
+import argparse, os, threading, time
+import uvicorn
+import bundle, config, engines
+
+
+def shared_bundle():
+    """Path of a bundle for the configured checkpoint, converting it on first use."""
+    ckpt = engines.load_checkpoint(config.CHECKPOINT_PATH)
+    path = os.path.join(config.ARTIFACT_DIR, "bundle-" + engines.artifact_tag(ckpt, config.CHECKPOINT_PATH))
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        print(f"converting {config.CHECKPOINT_PATH} into {path} (one time)")
+        bundle.build(path, config.CHECKPOINT_PATH)
+    return path
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def follow_checkpoint(bundle_dir, checkpoint_path, interval_s):
+    """Rewrite the bundle's head whenever the checkpoint changes (a daemon thread, never raises)."""
+    def watch():
+        seen = _stamp(checkpoint_path)
+        while True:
+            time.sleep(interval_s)
+            stamp = _stamp(checkpoint_path)
+            # As the workers' Reloader: only once the new file is present and has stopped changing
+            if stamp == seen or stamp is None:
+                continue
+            time.sleep(interval_s)
+            if _stamp(checkpoint_path) != stamp:
+                continue
+            seen = stamp
+            try:
+                bundle.replace_head(bundle_dir, checkpoint_path)
+                print(f"{checkpoint_path} changed: rewrote the head of {bundle_dir}")
+            except Exception as exc:
+                print(f"{checkpoint_path} changed but was not applied: {type(exc).__name__}: {exc}")
+
+    thread = threading.Thread(target=watch, name="follow-checkpoint", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve main:app with N workers sharing one copy of the weights")
+    parser.add_argument("--workers", type=int, default=config.WORKERS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    if args.workers > 1:
+        # Both are private to one process: the store's row index lives in memory, preview tokens too
+        if config.EMBED_STORE_DIR:
+            parser.error("RECYCLER_EMBED_STORE supports a single worker; unset it or use --workers 1")
+        if config.PREVIEW_MODE == "url":
+            parser.error("RECYCLER_PREVIEW_MODE=url supports a single worker; use inline previews")
+
+    # Workers are fresh processes and read their settings from the environment
+    if args.workers > 1 and not config.BUNDLE_PATH:
+        path = shared_bundle()
+        os.environ["RECYCLER_BUNDLE"] = path
+        if config.RELOAD_WATCH_S > 0:
+            follow_checkpoint(path, config.CHECKPOINT_PATH, config.RELOAD_WATCH_S)
+    os.environ["RECYCLER_WORKERS"] = str(args.workers)
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# stream.py
+"""Live frame streams: only the newest frame is processed, never a backlog."""
+import asyncio
+
+
+class LatestFrame:
+    """Single-slot mailbox between a connection's reader and its processing loop.
+
+    ``put`` overwrites a frame that wasn't taken yet, so a slow consumer
+    always gets the most recent frame and memory per connection stays at one
+    frame.
+    """
+
+    def __init__(self):
+        self._item = None
+        self._ready = asyncio.Event()
+        self.closed = False
+
+    def put(self, index, data):
+        """Store a frame; True when it replaced one that was never processed."""
+        replaced = self._item is not None
+        self._item = (index, data)
+        self._ready.set()
+        return replaced
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """The newest (index, data), or None once closed and drained."""
+        while self._item is None:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        item, self._item = self._item, None
+        return item
+
+
+class StreamStats:
+    def __init__(self):
+        self.open = self.opened = self.rejected = 0
+        self.frames = self.inferred = self.unchanged = self.coalesced = self.errors = 0
+
+    def stats(self):
+        return {
+            "open": self.open,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "frames": self.frames,
+            "inferred": self.inferred,
+            "unchanged": self.unchanged,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
@@ -0,0 +1,78 @@
+# subtypes.py
+"""Pick the "Specific Type" shown for a prediction from CLIP text embeddings of the subtypes.
+
+Every subtype string in class_info is encoded once with the CLIP text tower.
+The normalized matrix ships inside bundles (bundle.py build) and is
+otherwise cached on disk, both under a key made of the CLIP model, the
+prompt and the subtype table. Per request the choice is one small
+matmul of the image feature (already computed for the head) against that
+class's rows: no text encoding and no extra model pass.
+"""
+import hashlib, json, os
+import numpy as np
+import torch
+
+PROMPT = "a photo of {subtype}, a type of {category} waste"
+
+
+def _entries(class_info):
+    return [(key, subtype) for key, info in class_info.items() for subtype in info["subtypes"]]
+
+
+def cache_key(clip_name, class_info):
+    table = [(key, class_info[key]["category"], class_info[key]["subtypes"]) for key in class_info]
+    blob = json.dumps([clip_name, PROMPT, table], ensure_ascii=False).encode()
+    return f"{clip_name.replace('/', '-')}-{hashlib.sha256(blob).hexdigest()[:12]}"
+
+
+class SubtypeIndex:
+    def __init__(self, class_info, matrix):
+        self.matrix = torch.as_tensor(matrix, dtype=torch.float32)
+        self.rows = {}
+        start = 0
+        for key, info in class_info.items():
+            self.rows[key] = (start, start + len(info["subtypes"]), info["subtypes"])
+            start += len(info["subtypes"])
+        if start != len(self.matrix):
+            raise ValueError(f"subtype matrix has {len(self.matrix)} rows for {start} subtypes")
+
+    def pick(self, class_key, feat):
+        """The subtype of ``class_key`` whose text embedding is closest to the image feature."""
+        start, end, names = self.rows[class_key]
+        if end - start == 1:
+            return names[0]
+        scores = self.matrix[start:end] @ torch.as_tensor(feat, dtype=torch.float32)
+        return names[int(scores.argmax())]
+
+
+@torch.no_grad()
+def encode(encode_text, class_info, device="cpu"):
+    """[n_subtypes, dim] normalized text embeddings, in class_info order."""
+    import clip
+
+    prompts = [
+        PROMPT.format(subtype=subtype, category=class_info[key]["category"].lower())
+        for key, subtype in _entries(class_info)
+    ]
+    emb = encode_text(clip.tokenize(prompts).to(device)).float()
+    return (emb / emb.norm(dim=-1, keepdim=True)).cpu().numpy()
+
+
+def load_or_build(class_info, clip_name, encode_text=None, cache_dir="artifacts", device="cpu"):
+    """The index for ``class_info``: from the on-disk cache, else encoded with ``encode_text`` and cached.
+
+    Returns None when there is no cache and no text tower to encode with (a
+    bundle carries only the image tower), so callers can fall back; the CLIP
+    model is never loaded here.
+    """
+    path = os.path.join(cache_dir, f"subtypes-{cache_key(clip_name, class_info)}.npy")
+    if os.path.exists(path):
+        return SubtypeIndex(class_info, np.load(path))
+    if encode_text is None:
+        return None
+    matrix = encode(encode_text, class_info, device)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp, matrix)
+    os.replace(tmp, path)
+    return SubtypeIndex(class_info, matrix)
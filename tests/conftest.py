@@ -0,0 +1,73 @@
+import io, os, sys
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def standin_bundle(tmp_path_factory):
+    """A seeded CLIP-shaped stand-in (bench.standin_bundle), so the server runs without downloading CLIP."""
+    pytest.importorskip("clip")
+    import bench
+
+    path = str(tmp_path_factory.mktemp("standin") / "bundle")
+    bench.standin_bundle(path)
+    return path
+
+
+@pytest.fixture
+def server(standin_bundle, tmp_path, monkeypatch):
+    """The settings module, pointed at the stand-in; patch more of it before taking ``client``."""
+    import config
+
+    monkeypatch.setattr(config, "BUNDLE_PATH", standin_bundle)
+    monkeypatch.setattr(config, "ARTIFACT_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(config, "WARMUP_BATCH_SIZES", ())
+    monkeypatch.setattr(config, "RELOAD_WATCH_S", 0)
+    return config
+
+
+@pytest.fixture
+def client(server):
+    """In-process TestClient for main.app on the stand-in bundle."""
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def jpeg():
+    """jpeg(size, color) -> bytes of a solid-color JPEG."""
+    from PIL import Image
+
+    def make(size=(320, 240), color=(200, 40, 40)):
+        buf = io.BytesIO()
+        Image.new("RGB", size, color).save(buf, "JPEG")
+        return buf.getvalue()
+    return make
+
+
+@pytest.fixture
+def feature_dir(tmp_path):
+    """feature_dir(classes, n, dim, model) -> a features.py directory of random labeled rows, in two shards."""
+    import json
+    import numpy as np
+    import features
+
+    def make(classes, n=40, dim=8, model="ViT-B/32", seed=0):
+        root = tmp_path / f"features-{seed}"
+        root.mkdir()
+        rows = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float16)
+        half = n // 2
+        shards = [features._write_shard(str(root), 0, rows[:half]), features._write_shard(str(root), 1, rows[half:])]
+        files = {f"{classes[i % len(classes)]}/{i}.jpg": {"label": classes[i % len(classes)],
+                                                          "shard": shards[i >= half], "row": i % half}
+                 for i in range(n)}
+        manifest = {"format": features.FORMAT, "format_version": features.FORMAT_VERSION, "model": model,
+                    "dim": dim, "preprocess": "clip", "shards": shards, "files": files}
+        (root / "manifest.json").write_text(json.dumps(manifest))
+        return str(root)
+    return make
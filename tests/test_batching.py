@@ -0,0 +1,47 @@
+import asyncio
+from batching import MicroBatcher
+
+
+def run_batcher(fn, items, **kwargs):
+    async def run():
+        batcher = MicroBatcher(fn, **kwargs)
+        await batcher.start()
+        try:
+            results = await asyncio.gather(*(batcher.submit(i) for i in items), return_exceptions=True)
+        finally:
+            await batcher.stop()
+        return results, batcher.stats()
+    return asyncio.run(run())
+
+
+def test_concurrent_submits_share_one_forward_pass():
+    calls = []
+
+    def fn(items):
+        calls.append(list(items))
+        return [i * 10 for i in items]
+
+    results, stats = run_batcher(fn, range(5), max_batch_size=8, max_wait_ms=50)
+    assert results == [0, 10, 20, 30, 40]
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert stats["batches"] == 1 and stats["items"] == 5
+
+
+def test_batches_are_capped_at_max_batch_size():
+    sizes = []
+
+    def fn(items):
+        sizes.append(len(items))
+        return items
+
+    results, stats = run_batcher(fn, range(5), max_batch_size=2, max_wait_ms=50)
+    assert results == list(range(5)) and sizes == [2, 2, 1]
+    assert stats["batch_size_counts"] == {1: 1, 2: 2}
+
+
+def test_a_failed_batch_fails_every_caller():
+    def fn(items):
+        raise RuntimeError("engine down")
+
+    results, _ = run_batcher(fn, range(3), max_batch_size=8, max_wait_ms=20)
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,60 @@
+import os
+import pytest
+import torch
+from torch import nn
+import bundle, catalog
+
+clip_model = pytest.importorskip("clip.model")
+
+
+def test_round_trip_gives_the_same_logits(tmp_path):
+    torch.manual_seed(0)
+    visual = clip_model.VisionTransformer(input_resolution=64, patch_size=32, width=64, layers=2,
+                                          heads=2, output_dim=32).eval()
+    classes = list(catalog.CLASS_INFO)
+    head = nn.Sequential(nn.Linear(32, 16), nn.ReLU(), nn.Dropout(0.2), nn.Linear(16, len(classes))).eval()
+    path = str(tmp_path / "bundle")
+    bundle.write(path, visual, head, "standin", classes)
+
+    tower, loaded_head, meta = bundle.load(path, full_verify=True)
+    x = torch.randn(3, 3, 64, 64)
+    with torch.no_grad():
+        expected = head(visual(x))
+        assert torch.equal(loaded_head(tower.encode_image(x)), expected)
+        head_only, _ = bundle.load_head(path)
+        assert torch.equal(head_only(visual(x)), expected)
+    assert meta["classes"] == classes and meta["in_dim"] == 32 and meta["mlp_hidden"] == 16
+
+    with open(os.path.join(path, "weights.pt"), "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match="sha256"):
+        bundle.verify(path)
+
+
+def test_replace_head_keeps_the_vision_weights(tmp_path):
+    torch.manual_seed(0)
+    visual = clip_model.VisionTransformer(input_resolution=32, patch_size=32, width=64, layers=1,
+                                          heads=2, output_dim=8).eval()
+    classes = list(catalog.CLASS_INFO)
+    old = nn.Sequential(nn.Linear(8, 4), nn.ReLU(), nn.Dropout(0.2), nn.Linear(4, len(classes)))
+    path = str(tmp_path / "bundle")
+    bundle.write(path, visual, old, "standin", classes)
+    new = nn.Sequential(nn.Linear(8, 6), nn.ReLU(), nn.Dropout(0.2), nn.Linear(6, 2)).eval()
+    class_info = {key: catalog.CLASS_INFO[key] for key in classes[:2]}
+    checkpoint = str(tmp_path / "recycler_mlp.pth")
+    torch.save({"clip_name": "standin", "in_dim": 8, "mlp_hidden": 6, "classes": classes[:2],
+                "class_info": class_info, "mlp_state": new.state_dict()}, checkpoint)
+
+    bundle.replace_head(path, checkpoint)
+    tower, head, meta = bundle.load(path, full_verify=True)
+    x = torch.randn(2, 3, 32, 32)
+    with torch.no_grad():
+        assert torch.equal(head(tower.encode_image(x)), new(visual(x)))
+    assert meta["classes"] == classes[:2] and meta["class_info"] == class_info
+
+    torch.save({"clip_name": "ViT-L/14", "in_dim": 8}, checkpoint)
+    with pytest.raises(ValueError, match="ViT-L/14"):
+        bundle.replace_head(path, checkpoint)
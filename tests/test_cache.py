@@ -0,0 +1,62 @@
+import time
+from cache import PredictionCache, content_key
+
+
+def test_lru_eviction_and_stats():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a becomes most recent
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_ttl_expiry():
+    cache = PredictionCache(ttl_s=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_perceptual_tier():
+    cache = PredictionCache(perceptual_distance=2)
+    cache.put(content_key(b"frame"), "cat", dhash=0b1010)
+    assert cache.get(content_key(b"other bytes")) is None
+    assert cache.get_similar(0b1011) == "cat"   # 1 bit away
+    assert cache.get_similar(0b0101) is None    # 4 bits away
+    assert cache.stats()["perceptual_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_clear_counts_invalidations():
+    cache = PredictionCache(perceptual_distance=0)
+    cache.clear()
+    cache.put("a", 1, dhash=7)
+    cache.clear()
+    assert cache.get_similar(7) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_repeat_upload_is_served_from_the_cache(client, jpeg):
+    files = {"file": ("a.jpg", jpeg(), "image/jpeg")}
+    first = client.post("/api/v1/predict", files=files).json()
+    second = client.post("/api/v1/predict", files=files).json()
+    assert second["top_k"] == first["top_k"]
+    assert client.app.state.cache.stats()["hits"] == 1
+
+
+def test_undecodable_upload_is_400_and_inference_failure_is_500(server, jpeg, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app, raise_server_exceptions=False) as c:
+        r = c.post("/api/v1/predict", files={"file": ("a.jpg", b"not an image", "image/jpeg")})
+        assert r.status_code == 400 and r.json()["detail"] == "Invalid image file"
+
+        async def fail(x):
+            raise RuntimeError("device lost")
+
+        monkeypatch.setattr(main.app.state.batcher, "submit", fail)
+        assert c.post("/api/v1/predict", files={"file": ("a.jpg", jpeg(), "image/jpeg")}).status_code == 500
@@ -0,0 +1,32 @@
+import math
+import numpy as np
+import torch
+import cascade
+
+
+def test_margin():
+    logits = torch.tensor([[10.0, 0.0, 0.0], [1.0, 1.0, 0.0]])
+    m = cascade.margin(logits)
+    assert m[0] > 0.99 and abs(m[1].item()) < 1e-6
+    assert cascade.margin(torch.zeros(3, 1)).tolist() == [1.0, 1.0, 1.0]
+
+
+def test_choose_threshold_fewest_escalations_meeting_target():
+    margins = np.array([0.9, 0.8, 0.7, 0.6, 0.5])
+    first_ok = np.array([True, True, False, True, False])
+    full_ok = np.array([True, True, True, True, True])
+    # Answering the top two keeps 100%; any more loses the third input
+    threshold, acc, escalation = cascade.choose_threshold(margins, first_ok, full_ok, 1.0)
+    assert threshold == 0.8 and acc == 1.0 and escalation == 0.6
+    # At 60% the first stage may answer everything on its own
+    threshold, acc, escalation = cascade.choose_threshold(margins, first_ok, full_ok, 0.6)
+    assert threshold == 0.5 and acc == 0.6 and escalation == 0.0
+
+
+def test_choose_threshold_never_splits_ties():
+    margins = np.array([0.9, 0.9, 0.1])
+    first_ok = np.array([True, False, True])
+    full_ok = np.array([True, True, True])
+    # Answering only one of the two 0.9s isn't a threshold; both or neither
+    threshold, acc, escalation = cascade.choose_threshold(margins, first_ok, full_ok, 1.0)
+    assert math.isinf(threshold) and acc == 1.0 and escalation == 1.0
@@ -0,0 +1,16 @@
+import json
+import classify
+
+
+def test_read_progress_cuts_off_a_torn_checkpoint(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    good = [{"paths": ["a.jpg", "b.jpg"], "state": {"rows": 2}}, {"paths": ["c.jpg"], "state": {"rows": 3}}]
+    text = "".join(json.dumps(entry) + "\n" for entry in good)
+    path.write_text(text + '{"paths": ["d.jpg"], "sta')
+    done, state = classify.read_progress(str(path))
+    assert done == {"a.jpg", "b.jpg", "c.jpg"} and state == {"rows": 3}
+    assert path.read_text() == text
+
+
+def test_read_progress_without_a_file(tmp_path):
+    assert classify.read_progress(str(tmp_path / "missing.jsonl")) == (set(), None)
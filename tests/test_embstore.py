@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from embstore import EmbeddingStore
+
+
+def test_add_get_and_grow(tmp_path):
+    store = EmbeddingStore(str(tmp_path), dim=4, model_name="ViT-B/32", growth=2)
+    vectors = np.random.default_rng(0).standard_normal((5, 4)).astype(np.float32)
+    for i, v in enumerate(vectors):
+        assert store.add(f"k{i}", v) == i
+    assert store.add("k0", vectors[1]) == 0  # existing keys keep their row
+    assert len(store) == 5 and "k4" in store and "k5" not in store
+    assert store.get("k5") is None
+    np.testing.assert_allclose(store.get("k3"), vectors[3], atol=1e-2)
+    assert store.keys() == [f"k{i}" for i in range(5)] and store.vectors().shape == (5, 4)
+    store.close()
+
+
+def test_reopen_keeps_rows_and_checks_meta(tmp_path):
+    store = EmbeddingStore(str(tmp_path), dim=4, model_name="ViT-B/32")
+    store.add("a", [1, 0, 0, 0])
+    store.add("b", [0, 1, 0, 0])
+    store.close()
+    store = EmbeddingStore(str(tmp_path), dim=4, model_name="ViT-B/32")
+    assert store.keys() == ["a", "b"] and store.get("b").tolist() == [0, 1, 0, 0]
+    store.close()
+    with pytest.raises(ValueError, match="expected"):
+        EmbeddingStore(str(tmp_path), dim=4, model_name="ViT-L/14")
+    with pytest.raises(ValueError, match="expected"):
+        EmbeddingStore(str(tmp_path), dim=8, model_name="ViT-B/32")
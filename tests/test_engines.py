@@ -0,0 +1,28 @@
+import pytest
+import torch
+
+pytest.importorskip("clip")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+import bench, bundle, engines
+
+# Same bound as ``python engines.py <folder>``
+ATOL = 1e-3
+
+
+def test_onnx_engine_matches_torch(tmp_path):
+    bench.standin_bundle(str(tmp_path / "bundle"))
+    clip_model, head, _, meta = engines.load_model("cpu", bundle_path=str(tmp_path / "bundle"))
+    reference = engines.make_engine("torch", clip_model, head)
+    candidate = engines.make_engine("onnx", clip_model, head, artifact_dir=str(tmp_path), tag=meta["tag"])
+    assert candidate.name == "onnx"
+
+    torch.manual_seed(0)
+    for batch in (1, 5):
+        x = torch.randn(batch, 3, 224, 224)
+        ref_feat, ref_logits = reference(x)
+        feat, logits = candidate(x)
+        assert torch.equal(logits.argmax(1), ref_logits.argmax(1))
+        assert (logits - ref_logits).abs().max().item() <= ATOL
+        assert (feat - ref_feat).abs().max().item() <= ATOL
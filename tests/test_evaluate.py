@@ -0,0 +1,43 @@
+import pytest
+import torch
+from torch import nn
+import evaluate
+
+
+def checkpoint(path, classes, dim=8, clip_name="ViT-B/32"):
+    torch.manual_seed(0)
+    head = nn.Sequential(nn.Linear(dim, 16), nn.ReLU(), nn.Dropout(0.2), nn.Linear(16, len(classes)))
+    torch.save({"mlp_state": head.state_dict(), "classes": classes, "clip_name": clip_name,
+                "in_dim": dim, "mlp_hidden": 16}, path)
+    return str(path)
+
+
+@pytest.mark.parametrize("precision", ["int8", "bf16"])
+def test_features_score_the_head_alone(feature_dir, tmp_path, capsys, precision):
+    ckpt = checkpoint(tmp_path / "head.pth", ["glass", "paper"])
+    code = evaluate.main(["--features", feature_dir(["glass", "paper", "metal"], n=30),
+                          "--checkpoint", ckpt, "--precision", precision, "--batch-size", "7", "--max-drop", "1"])
+    out = capsys.readouterr().out
+    assert code == 0 and "30 stored features" in out and "20 with known labels" in out
+    assert "labels not in the checkpoint (agreement only): metal" in out
+
+
+def test_features_of_another_model_are_refused(feature_dir, tmp_path):
+    ckpt = checkpoint(tmp_path / "head.pth", ["glass"], clip_name="ViT-L/14")
+    with pytest.raises(SystemExit):
+        evaluate.main(["--features", feature_dir(["glass"]), "--checkpoint", ckpt])
+    with pytest.raises(SystemExit):
+        evaluate.main(["--checkpoint", ckpt])
+
+
+@pytest.mark.parametrize("mode", ["clip", "fast"])
+def test_images_go_through_the_served_model_and_preprocess(server, jpeg, tmp_path, capsys, monkeypatch, mode):
+    import catalog
+    monkeypatch.setattr(server, "PREPROCESS_MODE", mode)
+    monkeypatch.setattr(server, "ENGINE", "torch")
+    for i, key in enumerate(list(catalog.CLASS_INFO)[:2]):
+        (tmp_path / "data" / key).mkdir(parents=True)
+        (tmp_path / "data" / key / "a.jpg").write_bytes(jpeg(color=(40 * i, 90, 200)))
+    assert evaluate.main([str(tmp_path / "data"), "--precision", "int8", "--max-drop", "1"]) == 0
+    out = capsys.readouterr().out
+    assert f"2 images, engine=torch, preprocess={mode}, 2 with known labels" in out
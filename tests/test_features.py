@@ -0,0 +1,21 @@
+import pytest
+import features
+
+
+def test_rerun_adds_only_new_images_and_refuses_other_settings(server, jpeg, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "ENGINE", "torch")
+    monkeypatch.setattr(server, "PRECISION", "fp32")
+    images, out = tmp_path / "data", str(tmp_path / "features")
+    (images / "glass").mkdir(parents=True)
+    (images / "glass" / "a.jpg").write_bytes(jpeg())
+    manifest = features.extract(str(images), out, workers=1, log=lambda *_: None)
+    assert (manifest["engine"], manifest["precision"]) == ("torch", "fp32") and len(manifest["files"]) == 1
+
+    (images / "glass" / "b.jpg").write_bytes(jpeg(color=(10, 10, 200)))
+    features.extract(str(images), out, workers=1, log=lambda *_: None)
+    reader = features.FeatureShards(out)
+    assert reader.paths == ["glass/a.jpg", "glass/b.jpg"] and len(reader.manifest["shards"]) == 2
+
+    monkeypatch.setattr(server, "PRECISION", "int8")
+    with pytest.raises(ValueError, match="'precision': 'fp32'"):
+        features.extract(str(images), out, workers=1, log=lambda *_: None)
@@ -0,0 +1,29 @@
+import asyncio
+import hotreload
+
+
+def test_manual_reload_is_not_repeated_by_the_watcher(tmp_path):
+    path = tmp_path / "head.pth"
+    path.write_bytes(b"v1")
+    loads, swapped = [], []
+
+    def load():
+        loads.append(path.read_bytes())
+        return path.read_bytes()
+
+    async def run():
+        reloader = hotreload.Reloader(load, swapped.append, watch_paths=[str(path)], interval_s=0.01)
+        await reloader.start()
+        try:
+            path.write_bytes(b"v2!")
+            await reloader.reload()  # e.g. /admin/reload right after the copy
+            await asyncio.sleep(0.1)
+            path.write_bytes(b"v3!!")
+            await asyncio.sleep(0.1)
+        finally:
+            await reloader.stop()
+        return reloader.stats()
+
+    stats = asyncio.run(run())
+    assert loads == [b"v2!", b"v3!!"] and swapped == loads
+    assert stats["reloads"] == 2 and stats["failures"] == 0
@@ -0,0 +1,84 @@
+import io, tarfile, zipfile
+import numpy as np
+import pytest
+import torch
+from PIL import Image, ImageDraw
+import imaging
+
+# Same bound as ``python imaging.py <folder>`` (mean |fast - reference| in normalized units)
+TOLERANCE = 0.05
+
+
+def photo(width, height, seed=0):
+    """A smooth gradient with shapes and mild noise: closer to a photo than pure noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([255 * x / width, 255 * y / height, 128 + 100 * np.sin((x + y) / 40)], axis=-1)
+    image = Image.fromarray(np.clip(base + rng.normal(0, 6, base.shape), 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        draw.ellipse([x0, y0, x0 + width // 5, y0 + height // 5], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    return image
+
+
+def encode(image, fmt):
+    buf = io.BytesIO()
+    image.save(buf, fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+@pytest.mark.parametrize("size", [(224, 224), (640, 480), (480, 640), (1920, 1080), (300, 1200), (97, 61)])
+def test_fast_preprocess_matches_clip(fmt, size):
+    data = encode(photo(*size), fmt)
+    fast = imaging.FastPreprocess(224)
+    ref = imaging.clip_preprocess(224)(imaging.decode_image(data))
+    x = fast(imaging.decode_image(data, fast.draft_size))
+    assert x.dtype == torch.uint8 and x.shape == (3, 224, 224)
+    out = imaging.normalize(x.unsqueeze(0))[0]
+    assert out.shape == ref.shape
+    assert (out - ref).abs().mean().item() <= TOLERANCE
+
+
+def tar_gz(entries):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+        for name, data in entries:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def test_expand_archive_lists_wanted_members():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("d/a.jpg", b"a")
+        zf.writestr("__MACOSX/d/._a.jpg", b"x")
+        zf.writestr("d/.hidden.jpg", b"x")
+    assert imaging.expand_archive(buf.getvalue()) == [("d/a.jpg", b"a")]
+    assert imaging.expand_archive(tar_gz([("b.png", b"bb")])) == [("b.png", b"bb")]
+
+
+def test_expand_archive_caps():
+    # Rejected on the declared size: a large member is never decompressed
+    bomb = tar_gz([("a.jpg", b"x"), ("big.jpg", b"\0" * 50_000_000)])
+    with pytest.raises(imaging.TooLarge, match="big.jpg"):
+        imaging.expand_archive(bomb, max_member=1000)
+    with pytest.raises(imaging.TooLarge, match="expands past"):
+        imaging.expand_archive(tar_gz([(f"{i}.jpg", b"x" * 400) for i in range(5)]), max_total=1000)
+    with pytest.raises(imaging.TooLarge, match="more than 3 images"):
+        imaging.expand_archive(tar_gz([(f"{i}.jpg", b"x") for i in range(10)]), max_files=3)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(4):
+            zf.writestr(f"{i}.jpg", b"\0" * 300)
+    with pytest.raises(imaging.TooLarge):
+        imaging.expand_archive(buf.getvalue(), max_total=1000)
+    assert len(imaging.expand_archive(buf.getvalue(), max_member=300, max_total=1200, max_files=4)) == 4
+
+
+def test_invalid_image_is_reported_as_such():
+    with pytest.raises(imaging.InvalidImage):
+        imaging.prepare(b"not an image", tensor=False)
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pytest
+import torch
+import knn
+from knn import KNNIndex
+
+CLASSES = ["a", "b", "c"]
+
+
+def data(n=600, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((len(CLASSES), dim))
+    y = rng.integers(0, len(CLASSES), n)
+    x = centers[y] + 0.3 * rng.standard_normal((n, dim))
+    return x.astype(np.float32), [CLASSES[i] for i in y]
+
+
+def normalized(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_flat_search_is_exact(tmp_path):
+    x, labels = data()
+    index = KNNIndex.create(str(tmp_path / "flat"), x.shape[1], "test", CLASSES)
+    index.add(x, labels)
+    q = x[:20] + 0.1
+    scores, rows = index.search(q, k=5)
+    expected = np.argsort(-(normalized(q) @ normalized(x).T), axis=1)[:, :5]
+    assert (rows == expected).all()
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+
+
+def test_search_pads_when_the_index_is_small(tmp_path):
+    x, labels = data(n=3)
+    index = KNNIndex.create(str(tmp_path / "flat"), x.shape[1], "test", CLASSES)
+    index.add(x, labels)
+    scores, rows = index.search(x[0], k=5)
+    assert rows[0, 3:].tolist() == [-1, -1] and np.isneginf(scores[0, 3:]).all()
+
+
+def test_ivfpq_search_finds_the_exact_neighbours(tmp_path):
+    x, labels = data()
+    index = KNNIndex.create(str(tmp_path / "ivfpq"), x.shape[1], "test", CLASSES,
+                            kind="ivfpq", train=x, nlist=8, m=8)
+    index.add(x, labels)
+    q = x[:50]
+    _, rows = index.search(q, k=10, nprobe=8)
+    expected = np.argsort(-(normalized(q) @ normalized(x).T), axis=1)[:, :10]
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(rows, expected)])
+    assert recall >= 0.5
+    # Every query's own row comes back, and the vote goes to its class
+    assert all(i in r for i, r in enumerate(rows))
+    _, vote = index.lookup(q[0], k=10)
+    assert vote["class"] == labels[0]
+
+
+def test_readers_never_write_and_add_repairs(tmp_path):
+    x, labels = data(n=10)
+    root = str(tmp_path / "flat")
+    KNNIndex.create(root, x.shape[1], "test", CLASSES).add(x, labels)
+    # An add that died after writing its rows but before the ids line
+    with open(os.path.join(root, "vectors.f32"), "ab") as f:
+        f.write(b"\0" * 100)
+    sizes = {name: os.path.getsize(os.path.join(root, name)) for name in os.listdir(root)}
+    reader = KNNIndex(root)
+    assert len(reader) == 10
+    assert sizes == {name: os.path.getsize(os.path.join(root, name)) for name in os.listdir(root)}
+    writer = KNNIndex(root)
+    writer.add(x[:1], labels[:1], ["new"])
+    assert len(KNNIndex(root)) == 11
+    assert os.path.getsize(os.path.join(root, "vectors.f32")) == 11 * x.shape[1] * 4
+
+
+def test_create_refuses_an_existing_index(tmp_path):
+    KNNIndex.create(str(tmp_path / "flat"), 4, "test")
+    with pytest.raises(ValueError):
+        KNNIndex.create(str(tmp_path / "flat"), 4, "test")
+
+
+def test_build_needs_the_model_of_a_notebook_embedding_file(tmp_path):
+    x, labels = data(n=20)
+    # The notebook's train_emb.pt: features and labels, no clip_name
+    source = str(tmp_path / "train_emb.pt")
+    torch.save({"X": torch.from_numpy(x), "y": torch.tensor([CLASSES.index(c) for c in labels]),
+                "classes": CLASSES}, source)
+    with pytest.raises(SystemExit):
+        knn.main(["build", source, str(tmp_path / "unnamed")])
+    assert not os.path.exists(tmp_path / "unnamed")
+    knn.main(["build", source, str(tmp_path / "named"), "--clip-name", "ViT-B/32"])
+    index = KNNIndex(str(tmp_path / "named"))
+    assert index.model == "ViT-B/32" and len(index) == 20
@@ -0,0 +1,60 @@
+import io, json, zipfile
+import pytest
+import main
+
+
+def test_full_admission_gate_answers_429(client, jpeg):
+    gate = main.app.state.admission
+    gate.in_flight = gate.limit
+    try:
+        r = client.post("/api/v1/predict", files={"file": ("a.jpg", jpeg(), "image/jpeg")})
+    finally:
+        gate.in_flight = 0
+    assert r.status_code == 429 and r.headers["retry-after"] == str(gate.retry_after)
+    r = client.post("/api/v1/predict", files={"file": ("a.jpg", jpeg(), "image/jpeg")})
+    assert r.status_code == 200 and gate.stats()["in_flight"] == 0
+
+
+def test_api_predict_returns_top_k_json(client, jpeg):
+    r = client.post("/api/v1/predict?top_k=2", files={"file": ("a.jpg", jpeg(), "image/jpeg")})
+    assert r.status_code == 200 and r.headers["content-type"] == "application/json"
+    body = r.json()
+    probs = [entry["probability"] for entry in body["top_k"]]
+    assert len(probs) == 2 and probs == sorted(probs, reverse=True)
+    assert body["top_k"][0]["class"] == body["class"] and body["confidence"] == probs[0]
+    assert r.headers["x-model-version"] == body["model_version"]
+
+
+def test_api_predict_speaks_msgpack_when_asked(client, jpeg):
+    msgpack = pytest.importorskip("msgpack")
+    files = {"file": ("a.jpg", jpeg(), "image/jpeg")}
+    r = client.post("/api/v1/predict", files=files, headers={"Accept": "application/x-msgpack"})
+    assert r.headers["content-type"] == "application/x-msgpack"
+    # The stand-in ships no subtype embeddings, so the subtype is picked at random
+    packed = msgpack.unpackb(r.content)
+    as_json = client.post("/api/v1/predict", files=files).json()
+    assert packed.pop("subtype") and as_json.pop("subtype")
+    assert packed == as_json
+
+
+def test_batch_streams_one_line_per_file_with_errors(client, jpeg):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("d/b.jpg", jpeg(color=(10, 200, 10)))
+        zf.writestr("d/bad.jpg", b"not an image")
+    r = client.post("/api/v1/predict/batch?top_k=1", files=[
+        ("files", ("a.jpg", jpeg(), "image/jpeg")),
+        ("files", ("d.zip", archive.getvalue(), "application/zip")),
+    ])
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted((json.loads(line) for line in r.text.splitlines()), key=lambda line: line["index"])
+    assert [line["filename"] for line in lines] == ["a.jpg", "d/b.jpg", "d/bad.jpg"]
+    assert [line.get("error") for line in lines] == [None, None, "Invalid image file"]
+    assert all(len(line["top_k"]) == 1 for line in lines[:2])
+    assert main.app.state.admission.stats()["in_flight"] == 0
+
+
+def test_batch_refuses_more_images_than_allowed(server, client, jpeg, monkeypatch):
+    monkeypatch.setattr(server, "MAX_BATCH_FILES", 2)
+    r = client.post("/api/v1/predict/batch", files=[("files", (f"{i}.jpg", jpeg(), "image/jpeg")) for i in range(3)])
+    assert r.status_code == 413 and main.app.state.admission.stats()["in_flight"] == 0
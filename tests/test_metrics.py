@@ -0,0 +1,40 @@
+from metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("x_seconds", "help", "stage", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        h.observe("decode", value)
+    lines = h.render()
+    assert 'x_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'x_seconds_bucket{stage="decode",le="1.0"} 3' in lines
+    assert 'x_seconds_bucket{stage="decode",le="+Inf"} 4' in lines
+    assert 'x_seconds_count{stage="decode"} 4' in lines and 'x_seconds_sum{stage="decode"} 4.05' in lines
+
+
+def test_disabled_registry_records_nothing():
+    metrics = Metrics(enabled=False)
+    with metrics.stage("decode"):
+        pass
+    metrics.count_class("Plastic")
+    assert "recycler_stage_seconds_bucket" not in metrics.render()
+
+
+def test_metrics_endpoint_after_a_prediction(client, jpeg):
+    predicted = client.post("/api/v1/predict", files={"file": ("a.jpg", jpeg(), "image/jpeg")}).json()
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    assert 'recycler_stage_seconds_count{stage="decode"} 1' in text
+    assert 'recycler_request_seconds_count{endpoint="api_predict"} 1' in text
+    assert 'recycler_batch_size_count{engine="' in text
+    assert f'recycler_predictions_total{{class="{predicted["class"]}"}} 1' in text
+    assert "recycler_requests_in_flight 0" in text
+
+
+def test_metrics_can_be_turned_off(server, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    monkeypatch.setattr(server, "METRICS", False)
+    with TestClient(main.app) as c:
+        assert c.get("/metrics").status_code == 404
@@ -0,0 +1,20 @@
+import catalog
+from pages import LANDING_HTML, ResultPages, result_html
+
+
+def test_landing_page_etag_304_and_gzip(client):
+    r = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200 and r.headers["content-encoding"] == "gzip"
+    assert r.text == LANDING_HTML and r.headers["vary"] == "Accept-Encoding"
+    again = client.get("/", headers={"If-None-Match": r.headers["etag"]})
+    assert again.status_code == 304 and again.content == b""
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["etag"] == r.headers["etag"]
+
+
+def test_result_fragments_match_result_html():
+    pages = ResultPages(catalog.CLASS_INFO)
+    values = {"predicted_class": "Plastic <&>", "specific_type": "PET Bottle",
+              "preview_src": "data:image/jpeg;base64,AAAA"}
+    for key in catalog.CLASS_INFO:
+        assert pages.render(key, **values) == result_html(catalog.CLASS_INFO, key, **values).encode()
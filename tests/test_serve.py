@@ -0,0 +1,30 @@
+import os
+import time
+import pytest
+import torch
+import bundle, serve
+
+
+def test_one_worker_serves_the_checkpoint_itself(monkeypatch):
+    runs = []
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **kw: runs.append(kw))
+    monkeypatch.setattr(serve.config, "BUNDLE_PATH", None)
+    monkeypatch.delenv("RECYCLER_BUNDLE", raising=False)
+    monkeypatch.setattr(serve, "shared_bundle", lambda: pytest.fail("converted for one worker"))
+    serve.main(["--workers", "1"])
+    assert runs[0]["workers"] == 1 and "RECYCLER_BUNDLE" not in os.environ
+
+
+def test_bundle_follows_its_checkpoint(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bundle, "replace_head", lambda *args: calls.append(args))
+    checkpoint = str(tmp_path / "recycler_mlp.pth")
+    torch.save({"v": 1}, checkpoint)
+    serve.follow_checkpoint("bundle-dir", checkpoint, 0.02)
+    time.sleep(0.1)
+    assert calls == []
+    torch.save({"v": 2, "longer": True}, checkpoint)
+    deadline = time.monotonic() + 2
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert calls == [("bundle-dir", checkpoint)]
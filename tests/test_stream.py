@@ -0,0 +1,41 @@
+import asyncio
+from stream import LatestFrame
+
+
+def test_latest_frame_keeps_only_the_newest():
+    async def run():
+        latest = LatestFrame()
+        assert latest.put(1, b"a") is False
+        assert latest.put(2, b"b") is True   # frame 1 was never taken
+        assert await latest.get() == (2, b"b")
+        latest.put(3, b"c")
+        latest.close()
+        # Closing still hands out the frame that was waiting
+        assert await latest.get() == (3, b"c")
+        assert await latest.get() is None
+    asyncio.run(run())
+
+
+def test_latest_frame_get_waits_for_put():
+    async def run():
+        latest = LatestFrame()
+        waiter = asyncio.create_task(latest.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        latest.put(1, b"a")
+        assert await asyncio.wait_for(waiter, 1) == (1, b"a")
+    asyncio.run(run())
+
+
+def test_stream_skips_unchanged_frames_and_reports_bad_ones(client, jpeg):
+    with client.websocket_connect("/ws/stream") as ws:
+        ws.send_bytes(jpeg(color=(200, 10, 10)))
+        first = ws.receive_json()
+        assert first["frame"] == 1 and "class" in first
+        ws.send_bytes(jpeg(color=(201, 10, 10)))  # too close to the last one to classify
+        ws.send_bytes(b"junk")
+        assert ws.receive_json() == {"event": "error", "frame": 3, "detail": "Invalid image file"}
+        ws.send_bytes(jpeg(color=(10, 200, 10)))
+        assert ws.receive_json()["frame"] == 4
+    streams = client.app.state.streams.stats()
+    assert streams["unchanged"] == 1 and streams["inferred"] == 2
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import torch
+from torch import nn
+import bundle, subtypes
+
+CLASS_INFO = {
+    "bottle": {"category": "Plastic", "subtypes": ["PET Bottle", "HDPE Jug", "Cap"]},
+    "can": {"category": "Metal", "subtypes": ["Aluminium Can"]},
+}
+
+
+def test_pick_takes_the_closest_subtype_of_the_class():
+    index = subtypes.SubtypeIndex(CLASS_INFO, np.eye(4, dtype=np.float32))
+    assert index.pick("bottle", [0.1, 0.9, 0.2, 0.0]) == "HDPE Jug"
+    assert index.pick("bottle", [0.0, 0.0, 0.3, 1.0]) == "Cap"  # row 3 belongs to "can"
+    assert index.pick("can", [1.0, 0.0, 0.0, 0.0]) == "Aluminium Can"
+    with pytest.raises(ValueError, match="3 rows for 4 subtypes"):
+        subtypes.SubtypeIndex(CLASS_INFO, np.eye(3, dtype=np.float32))
+
+
+def test_bundle_ships_subtypes_for_its_class_table(tmp_path):
+    clip_model = pytest.importorskip("clip.model")
+    visual = clip_model.VisionTransformer(input_resolution=32, patch_size=32, width=64, layers=1,
+                                          heads=2, output_dim=4)
+    head = nn.Sequential(nn.Linear(4, 8), nn.ReLU(), nn.Dropout(0.2), nn.Linear(8, 2))
+    path = str(tmp_path / "bundle")
+    bundle.write(path, visual, head, "standin", list(CLASS_INFO), CLASS_INFO,
+                 subtype_matrix=np.eye(4, dtype=np.float32))
+    index = bundle.load_subtypes(path, CLASS_INFO)
+    assert index.pick("bottle", torch.tensor([0.0, 0.0, 1.0, 0.0])) == "Cap"
+    renamed = {**CLASS_INFO, "can": {"category": "Metal", "subtypes": ["Tin Can"]}}
+    assert bundle.load_subtypes(path, renamed) is None
+
+
+def test_load_or_build_without_a_text_tower(tmp_path):
+    assert subtypes.load_or_build(CLASS_INFO, "ViT-B/32", cache_dir=str(tmp_path)) is None
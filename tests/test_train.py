@@ -0,0 +1,52 @@
+import pytest
+import torch
+from torch import nn
+import train
+
+
+def test_linear_as_mlp_is_exact():
+    torch.manual_seed(0)
+    linear = nn.Linear(16, 6)
+    mlp = train.linear_as_mlp(linear)
+    x = torch.randn(64, 16) * 3
+    with torch.no_grad():
+        assert torch.allclose(mlp(x), linear(x), atol=1e-5)
+    # The server's head layout: Linear, ReLU, Dropout, Linear
+    assert [type(m) for m in mlp] == [nn.Linear, nn.ReLU, nn.Dropout, nn.Linear]
+
+
+def features_file(path, classes, n=40, dim=8, seed=0):
+    gen = torch.Generator().manual_seed(seed)
+    torch.save({"X": torch.randn(n, dim, generator=gen), "y": torch.arange(n) % len(classes),
+                "classes": classes}, path)
+    return str(path)
+
+
+def test_validation_without_training_labels_fails_early(tmp_path, capsys):
+    train_pt = features_file(tmp_path / "train.pt", ["glass", "paper"])
+    val_pt = features_file(tmp_path / "val.pt", ["metal"])
+    with pytest.raises(SystemExit):
+        train.main([train_pt, "--val", val_pt, "--out", str(tmp_path / "head.pth")])
+    assert "no labels among the training classes" in capsys.readouterr().err
+    assert not (tmp_path / "head.pth").exists()
+
+
+def test_default_output_is_not_the_served_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    train.main([features_file(tmp_path / "train.pt", ["glass", "paper"]), "--solver", "logreg"])
+    assert (tmp_path / "recycler_mlp.new.pth").exists()
+    assert not (tmp_path / "recycler_mlp.pth").exists()
+
+
+def test_eval_streams_a_feature_directory(feature_dir, tmp_path, capsys):
+    import features
+
+    test_dir = feature_dir(["glass", "paper", "metal"], n=30)
+    head = nn.Sequential(nn.Linear(8, 4), nn.ReLU(), nn.Dropout(0.2), nn.Linear(4, 2)).eval()
+    X, y = features.FeatureShards(test_dir).load(["glass", "paper"])
+    # Batches smaller than a shard; "metal" isn't a training class and is left out
+    assert train.streamed_accuracy(head, test_dir, ["glass", "paper"], batch_size=7) == pytest.approx(
+        train.accuracy(head, X, y))
+    train.main([features_file(tmp_path / "train.pt", ["glass", "paper"], dim=8), "--solver", "logreg",
+                "--eval", test_dir, "--out", str(tmp_path / "head.pth")])
+    assert "test_acc" in capsys.readouterr().out
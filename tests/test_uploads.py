@@ -0,0 +1,49 @@
+import asyncio
+import json
+from uploads import BodyLimit
+
+
+async def echo(scope, receive, send):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+
+def call(app, path, chunks, content_length=None):
+    headers = [(b"content-length", str(content_length).encode())] if content_length is not None else []
+    scope = {"type": "http", "path": path, "headers": headers}
+    incoming = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = sent[0]["status"]
+    return status, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_declared_length_over_limit_is_refused_up_front():
+    status, body = call(BodyLimit(echo, {"/up": 10}), "/up", [b"x" * 20], content_length=20)
+    assert status == 413 and "10 bytes" in json.loads(body)["detail"]
+
+
+def test_chunked_body_is_cut_off_at_the_limit():
+    status, _ = call(BodyLimit(echo, {"/up": 10}), "/up", [b"x" * 6, b"x" * 6])
+    assert status == 413
+
+
+def test_bodies_within_the_limit_and_other_paths_pass():
+    app = BodyLimit(echo, {"/up": 10})
+    assert call(app, "/up", [b"x" * 5, b"y" * 5]) == (200, b"xxxxxyyyyy")
+    assert call(app, "/other", [b"z" * 50]) == (200, b"z" * 50)
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+from workers import AdmissionGate, AdmittedStream
+
+
+def test_gate_rejects_past_its_limit_with_retry_after():
+    gate = AdmissionGate(2, retry_after=3)
+    gate.acquire()
+    with gate.slot():
+        with pytest.raises(HTTPException) as exc:
+            gate.acquire()
+    assert exc.value.status_code == 429 and exc.value.headers == {"Retry-After": "3"}
+    assert gate.stats() == {"limit": 2, "in_flight": 1, "admitted": 2, "rejected": 1}
+
+
+def test_admitted_stream_releases_when_the_client_is_gone():
+    gate = AdmissionGate(1)
+    gate.acquire()
+
+    async def body():
+        yield b"never sent"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    response = AdmittedStream(body(), gate)
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
+    assert gate.in_flight == 0
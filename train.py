@@ -0,0 +1,226 @@
+# train.py
+"""Train the classifier head on stored CLIP features and write a recycler_mlp.pth-style checkpoint.
+
+    python train.py features/train                           # -> recycler_mlp.new.pth
+    python train.py features/train --solver logreg --eval features/test
+    python train.py train_emb.pt --val features/valid      # the notebook's torch.save output
+
+Inputs are feature directories from features.py or the notebook's
+``{"X", "y", "classes"}`` .pt files. Two solvers:
+
+* ``mlp``: the notebook's Linear -> ReLU -> Dropout -> Linear head, AdamW on
+  shuffled index batches of in-memory tensors (no DataLoader);
+* ``logreg``: multinomial logistic regression fitted full-batch with L-BFGS,
+  usually in a couple of seconds. It is written into the same two-layer
+  layout (hidden = 2 * in_dim, first layer [I; -I], since
+  relu(x) - relu(-x) = x), so the checkpoint loads unchanged.
+
+Both take class-weighted cross entropy and stop early on a validation split.
+"""
+import argparse, copy, os, sys, time
+import torch
+from torch import nn
+import engines
+
+
+def load_features(path, classes=None):
+    """(X float32 [N, D], y long [N], classes, clip name) from a feature directory or .pt file."""
+    if os.path.isdir(path):
+        import features
+
+        reader = features.FeatureShards(path)
+        classes = classes or reader.classes
+        X, y = reader.load(classes)
+        return X, y, classes, reader.model
+    blob = torch.load(path, map_location="cpu")
+    X, y, names = blob["X"].float(), blob["y"].long(), list(blob["classes"])
+    if classes is not None and classes != names:
+        # Re-index onto the training classes; unknown names become -1
+        remap = torch.tensor([classes.index(c) if c in classes else -1 for c in names])
+        y = remap[y]
+    return X, y, classes or names, blob.get("clip_name")
+
+
+def class_weights(y, n_classes, mode):
+    if mode == "none":
+        return None
+    counts = torch.bincount(y, minlength=n_classes).float()
+    # "balanced": n / (k * count), as in scikit-learn; absent classes get no weight
+    return torch.where(counts > 0, len(y) / (n_classes * counts.clamp(min=1)), torch.zeros_like(counts))
+
+
+def split(X, y, fraction, seed):
+    """Random train/validation split, stratified per class."""
+    gen = torch.Generator().manual_seed(seed)
+    val = []
+    for c in y.unique():
+        idx = (y == c).nonzero().squeeze(1)
+        idx = idx[torch.randperm(len(idx), generator=gen)]
+        val.append(idx[: int(round(fraction * len(idx)))])
+    mask = torch.zeros(len(y), dtype=torch.bool)
+    mask[torch.cat(val)] = True
+    return X[~mask], y[~mask], X[mask], y[mask]
+
+
+@torch.no_grad()
+def accuracy(model, X, y):
+    keep = y >= 0
+    if not keep.any():
+        return float("nan")
+    return (model(X[keep]).argmax(1) == y[keep]).float().mean().item()
+
+
+@torch.no_grad()
+def streamed_accuracy(model, path, classes, batch_size=65536):
+    """accuracy over a feature directory one batch at a time; a .pt file is small enough to load whole."""
+    if not os.path.isdir(path):
+        X, y, _, _ = load_features(path, classes)
+        return accuracy(model, X, y)
+    import features
+
+    correct = labeled = 0
+    for X, y, _ in features.FeatureShards(path).iter_batches(batch_size, classes):
+        keep = y >= 0
+        correct += (model(X[keep]).argmax(1) == y[keep]).sum().item()
+        labeled += int(keep.sum())
+    return correct / labeled if labeled else float("nan")
+
+
+def linear_as_mlp(linear):
+    """The two-layer head computing exactly ``linear``: relu(x) - relu(-x) = x."""
+    in_dim, n_classes = linear.in_features, linear.out_features
+    mlp = nn.Sequential(nn.Linear(in_dim, 2 * in_dim), nn.ReLU(), nn.Dropout(0.2), nn.Linear(2 * in_dim, n_classes))
+    eye = torch.eye(in_dim)
+    with torch.no_grad():
+        mlp[0].weight.copy_(torch.cat([eye, -eye]))
+        mlp[0].bias.zero_()
+        mlp[3].weight.copy_(torch.cat([linear.weight, -linear.weight], dim=1))
+        mlp[3].bias.copy_(linear.bias)
+    return mlp.eval()
+
+
+def fit_mlp(X, y, Xv, yv, n_classes, weight, hidden=256, epochs=200, batch_size=256,
+            lr=2e-3, weight_decay=1e-2, patience=10, seed=0, log=print):
+    torch.manual_seed(seed)
+    mlp = nn.Sequential(
+        nn.Linear(X.shape[1], hidden), nn.ReLU(), nn.Dropout(0.2), nn.Linear(hidden, n_classes)
+    ).to(X.device)
+    criterion = nn.CrossEntropyLoss(weight=weight)
+    optimizer = torch.optim.AdamW(mlp.parameters(), lr=lr, weight_decay=weight_decay)
+    best, best_state, stale = float("-inf"), None, 0
+    for epoch in range(epochs):
+        mlp.train()
+        for idx in torch.randperm(len(y), device=X.device).split(batch_size):
+            optimizer.zero_grad()
+            criterion(mlp(X[idx]), y[idx]).backward()
+            optimizer.step()
+        mlp.eval()
+        score = accuracy(mlp, Xv, yv) if len(yv) else epoch  # no validation: keep the last epoch
+        if score > best:
+            best, best_state, stale = score, copy.deepcopy(mlp.state_dict()), 0
+        else:
+            stale += 1
+            if stale >= patience:
+                log(f"  early stop after epoch {epoch + 1}")
+                break
+    if best_state is not None:
+        mlp.load_state_dict(best_state)
+    return mlp.eval(), hidden
+
+
+def fit_logreg(X, y, Xv, yv, n_classes, weight, l2=1e-4, rounds=50, steps_per_round=20,
+               patience=3, log=print):
+    linear = nn.Linear(X.shape[1], n_classes).to(X.device)
+    nn.init.zeros_(linear.weight)
+    nn.init.zeros_(linear.bias)
+    criterion = nn.CrossEntropyLoss(weight=weight)
+    optimizer = torch.optim.LBFGS(linear.parameters(), lr=1, max_iter=steps_per_round,
+                                  history_size=20, line_search_fn="strong_wolfe")
+
+    def closure():
+        optimizer.zero_grad()
+        loss = criterion(linear(X), y) + l2 * linear.weight.pow(2).sum()
+        loss.backward()
+        return loss
+
+    best, best_state, stale = float("-inf"), None, 0
+    for r in range(rounds):
+        loss = optimizer.step(closure).item()
+        score = accuracy(linear, Xv, yv) if len(yv) else -loss
+        if score > best:
+            best, best_state, stale = score, copy.deepcopy(linear.state_dict()), 0
+        else:
+            stale += 1
+            if stale >= patience:
+                log(f"  early stop after {(r + 1) * steps_per_round} L-BFGS iterations")
+                break
+    if best_state is not None:
+        linear.load_state_dict(best_state)
+    return linear_as_mlp(linear.cpu()).to(X.device), 2 * X.shape[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the classifier head on stored CLIP features")
+    parser.add_argument("train", help="feature directory (features.py) or notebook .pt file")
+    parser.add_argument("--out", default="recycler_mlp.new.pth",
+                        help="checkpoint to write; not the served recycler_mlp.pth, which a running server hot-swaps")
+    parser.add_argument("--solver", choices=["mlp", "logreg"], default="mlp")
+    parser.add_argument("--val", help="validation features; default: hold out --val-split of train")
+    parser.add_argument("--val-split", type=float, default=0.1)
+    parser.add_argument("--eval", help="test features, reported after training")
+    parser.add_argument("--class-weight", choices=["balanced", "none"], default="balanced")
+    parser.add_argument("--hidden", type=int, default=256, help="mlp hidden width")
+    parser.add_argument("--epochs", type=int, default=200, help="mlp epoch limit")
+    parser.add_argument("--patience", type=int, default=10, help="mlp epochs without improvement")
+    parser.add_argument("--l2", type=float, default=1e-4, help="logreg L2 penalty")
+    parser.add_argument("--clip-name", help="CLIP model the features came from (default: from the input)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    X, y, classes, clip_name = load_features(args.train)
+    clip_name = args.clip_name or clip_name or "ViT-B/32"
+    if args.val:
+        Xv, yv, _, _ = load_features(args.val, classes)
+    else:
+        X, y, Xv, yv = split(X, y, args.val_split, args.seed)
+    keep, keep_v = y >= 0, yv >= 0
+    if args.val and not keep_v.any():
+        parser.error(f"--val {args.val} has no labels among the training classes {classes}")
+    X, y = X[keep].to(device), y[keep].to(device)
+    Xv, yv = Xv[keep_v].to(device), yv[keep_v].to(device)
+    weight = class_weights(y, len(classes), args.class_weight)
+    weight = weight.to(device) if weight is not None else None
+    print(f"{len(y)} train / {len(yv)} validation features, {len(classes)} classes, solver {args.solver}")
+
+    started = time.perf_counter()
+    if args.solver == "mlp":
+        head, hidden = fit_mlp(X, y, Xv, yv, len(classes), weight, hidden=args.hidden,
+                               epochs=args.epochs, patience=args.patience, seed=args.seed)
+    else:
+        head, hidden = fit_logreg(X, y, Xv, yv, len(classes), weight, l2=args.l2)
+    elapsed = time.perf_counter() - started
+    head = head.cpu()
+    report = {"train_acc": accuracy(head, X.cpu(), y.cpu()), "val_acc": accuracy(head, Xv.cpu(), yv.cpu())}
+    if args.eval:
+        report["test_acc"] = streamed_accuracy(head, args.eval, classes)
+    print(f"trained in {elapsed:.1f}s: " + ", ".join(f"{k} {v:.4f}" for k, v in report.items()))
+
+    # Same keys as the notebook's checkpoint, so lifespan / engines.build_head load it as is
+    ckpt = {
+        "mlp_state": head.state_dict(),
+        "classes": classes,
+        "clip_name": clip_name,
+        "in_dim": X.shape[1],
+        "mlp_hidden": hidden,
+        "training": {"solver": args.solver, "class_weight": args.class_weight, "seconds": elapsed, **report},
+    }
+    engines.build_head(ckpt)  # fail here, not at server start, if the layout ever drifts
+    torch.save(ckpt, args.out + ".tmp")
+    os.replace(args.out + ".tmp", args.out)
+    print(f"wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# uploads.py
+"""Bounded request bodies: uploads are read in chunks against a byte cap and refused with 413."""
+import json
+from fastapi import HTTPException
+
+
+def too_large(limit, what="Upload"):
+    return HTTPException(status_code=413, detail=f"{what} exceeds {limit} bytes")
+
+
+async def read_capped(file, limit, chunk_size=1 << 16):
+    """An UploadFile's bytes, read chunk by chunk; 413 as soon as they pass ``limit``. Closes the file."""
+    try:
+        if file.size is not None and file.size > limit:
+            raise too_large(limit)
+        chunks, total = [], 0
+        while chunk := await file.read(chunk_size):
+            total += len(chunk)
+            if total > limit:
+                raise too_large(limit)
+            chunks.append(chunk)
+        return b"".join(chunks)
+    finally:
+        await file.close()  # drop the spooled copy now, not when the request ends
+
+
+class BodyLimit:
+    """ASGI middleware: 413 for request bodies over their path's limit, before the app parses them.
+
+    A declared Content-Length over the limit is refused up front; chunked
+    bodies are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits  # path -> max body bytes
+
+    @staticmethod
+    async def _reject(send, limit):
+        body = json.dumps({"detail": f"Request body exceeds {limit} bytes"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            return await self._reject(send, limit)
+        received, rejected = 0, False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request" and not rejected:
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    await self._reject(send, limit)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
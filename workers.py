@@ -0,0 +1,96 @@
+# workers.py
+"""Executor for the blocking CPU stages and admission control in front of it."""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+import imaging
+
+
+def make_executor(kind, workers, preprocess):
+    """Thread or process pool whose workers all have ``preprocess`` installed."""
+    if kind == "process":
+        # spawn: forking a process that already holds torch threads is unsafe
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=imaging.set_preprocess,
+            initargs=(preprocess,),
+        )
+    if kind == "thread":
+        imaging.set_preprocess(preprocess)
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+    raise ValueError(f"Unknown executor kind {kind!r} (expected 'thread' or 'process')")
+
+
+def prefetch(executor, fn, items, batch_size):
+    """Yield (chunk, futures) per batch of ``items``, with the next batch already running on ``executor``."""
+    pending = None
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        futures = [executor.submit(fn, item) for item in chunk]
+        if pending is not None:
+            yield pending
+        pending = (chunk, futures)
+    if pending is not None:
+        yield pending
+
+
+class AdmissionGate:
+    """Bounds the number of requests in flight; overflow is rejected with 429."""
+
+    def __init__(self, limit, retry_after=1):
+        self.limit = max(1, int(limit))
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmittedStream(StreamingResponse):
+    """Streaming response that returns its admission slot once sent, failed or abandoned.
+
+    The slot is released here rather than in the body generator, which never
+    runs when the client goes away before the first chunk.
+    """
+
+    def __init__(self, content, gate, **kwargs):
+        super().__init__(content, **kwargs)
+        self.gate = gate
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.gate.release()